@@ -0,0 +1,125 @@
+# Fixed size action space for policies: 64 from-squares x 73 move types, laid
+# out like the 8x8 board of to_array (index = from square * 73 + move type,
+# square as in fow_chess.packed_move). Move types 0-55 are queen-like moves (8 directions x
+# distances 1-7, also used by queen promotions, king moves and castling), 56-63
+# knight moves and 64-72 under-promotions to a knight, bishop or rook, each
+# capturing left, moving straight or capturing right.
+from typing import TYPE_CHECKING, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from fow_chess.chesscolor import ChessColor
+from fow_chess.move import Move
+from fow_chess.packed_move import PROMOTION, pack_move
+
+if TYPE_CHECKING:
+    from fow_chess.board import Board
+
+MOVE_TYPES = 73
+ACTION_SIZE = 64 * MOVE_TYPES
+
+QUEEN_DIRECTIONS = [
+    (1, 0),
+    (1, 1),
+    (0, 1),
+    (-1, 1),
+    (-1, 0),
+    (-1, -1),
+    (0, -1),
+    (1, -1),
+]
+KNIGHT_JUMPS = [(2, 1), (1, 2), (-1, 2), (-2, 1), (-2, -1), (-1, -2), (1, -2), (2, -1)]
+UNDER_PROMOTIONS = 3  # knight, bishop, rook: the first ones of PROMOTION_TYPES
+
+
+def _move_types() -> np.ndarray:
+    # MOVE_TYPE[from, to]: move type of a move between the squares, -1 if none
+    table = np.full((64, 64), -1, dtype=np.int16)
+    for square in range(64):
+        rank, file = divmod(square, 8)
+        for direction, (d_rank, d_file) in enumerate(QUEEN_DIRECTIONS):
+            for distance in range(1, 8):
+                to_rank, to_file = rank + d_rank * distance, file + d_file * distance
+                if 0 <= to_rank < 8 and 0 <= to_file < 8:
+                    table[square, to_rank * 8 + to_file] = direction * 7 + distance - 1
+        for jump, (d_rank, d_file) in enumerate(KNIGHT_JUMPS):
+            if 0 <= rank + d_rank < 8 and 0 <= file + d_file < 8:
+                table[square, (rank + d_rank) * 8 + file + d_file] = 56 + jump
+    return table
+
+
+MOVE_TYPE = _move_types()
+
+
+def packed_to_actions(packed_moves: Union[Sequence[int], np.ndarray]) -> np.ndarray:
+    """Actions of packed moves (see fow_chess.packed_move), all at once."""
+    packed = np.asarray(packed_moves, dtype=np.uint16).astype(np.intp)
+    from_sq = packed & 0x3F
+    to_sq = packed >> 6 & 0x3F
+    move_types = MOVE_TYPE[from_sq, to_sq].astype(np.intp)
+    move_flags = packed >> 12
+    piece = move_flags & 3
+    under = (move_flags & PROMOTION != 0) & (piece < UNDER_PROMOTIONS)
+    move_types[under] = (
+        64 + piece[under] * 3 + (to_sq[under] % 8 - from_sq[under] % 8 + 1)
+    )
+    return from_sq * MOVE_TYPES + move_types
+
+
+def move_to_action(move: Move) -> int:
+    return int(packed_to_actions([pack_move(move)])[0])
+
+
+def moves_to_actions(moves: Iterable[Move]) -> np.ndarray:
+    return packed_to_actions([pack_move(move) for move in moves])
+
+
+def legal_action_masks(
+    boards: Sequence["Board"],
+    colors: Optional[Union[ChessColor, Sequence[ChessColor]]] = None,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """(N, ACTION_SIZE) masks of the legal actions of every board.
+
+    colors defaults to the side to move of each board. If `out` is given,
+    the first N rows are overwritten and returned.
+    """
+    n = len(boards)
+    if colors is None:
+        colors = [board.side_to_move for board in boards]
+    elif isinstance(colors, ChessColor):
+        colors = [colors] * n
+    if out is None:
+        out = np.empty((n, ACTION_SIZE), dtype=bool)
+    elif out.shape[0] < n or out.shape[1:] != (ACTION_SIZE,):
+        raise ValueError(f"out must have shape ({n}, {ACTION_SIZE}), got {out.shape}")
+    out = out[:n]
+    out[:] = False
+    rows = []
+    packed = []
+    for i, (board, color) in enumerate(zip(boards, colors)):
+        moves = board.legal_moves_packed(color)
+        rows.append(np.full(len(moves), i, dtype=np.intp))
+        packed.append(np.frombuffer(moves, dtype=np.uint16))
+    if n:
+        out[np.concatenate(rows), packed_to_actions(np.concatenate(packed))] = True
+    return out
+
+
+# returns: the packed legal move of the side to move with the given action
+def action_to_packed(board: "Board", action: int) -> int:
+    moves = board.legal_moves_packed(board.side_to_move)
+    matches = np.flatnonzero(packed_to_actions(moves) == action)
+    if not len(matches):
+        raise ValueError(f"Action {action} is not legal in {board.fen}")
+    return moves[matches[0]]
+
+
+def action_to_move(board: "Board", action: int) -> Move:
+    return board.move_from_packed(action_to_packed(board, action))
+
+
+def actions_to_moves(boards: Sequence["Board"], actions: Sequence[int]) -> List[Move]:
+    return [
+        action_to_move(board, int(action)) for board, action in zip(boards, actions)
+    ]
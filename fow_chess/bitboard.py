@@ -0,0 +1,729 @@
+# Bitboard engine: one 64-bit integer per (color, piece type).
+# Square index is (rank - 1) * 8 + (file - 1), so a1 = 0, h1 = 7 and h8 = 63,
+# which is also the row-major index into the (8, 8) planes of to_array.
+from array import array
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+
+from fow_chess.board import FULL, Board
+from fow_chess.chesscolor import ChessColor
+from fow_chess.fen_parser import FenParser
+from fow_chess.move import Move
+from fow_chess.piece import PIECE_LETTERS, Piece, PieceType
+from fow_chess.position import SQUARES, Position
+from fow_chess.tables import (
+    KING_ATTACKS,
+    KNIGHT_ATTACKS,
+    PAWN_ATTACKS,
+    between,
+    bishop_attacks,
+    iter_bits,
+    rook_attacks,
+)
+from fow_chess.zobrist import PIECE_KEYS
+
+PIECE_TYPES = [
+    PieceType.PAWN,
+    PieceType.KNIGHT,
+    PieceType.BISHOP,
+    PieceType.ROOK,
+    PieceType.QUEEN,
+    PieceType.KING,
+]
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+COLORS = (ChessColor.WHITE, ChessColor.BLACK)
+PROMOTION_TYPES = [PieceType.QUEEN, PieceType.ROOK, PieceType.BISHOP, PieceType.KNIGHT]
+NO_PROMOTION = (None,)
+# FEN letters by color and ordinal
+PIECE_CHARS = ["PNBRQK", "pnbrqk"]
+RANK_MASKS = [0xFF << (8 * rank) for rank in range(8)]
+RANK_SHIFTS = range(0, 64, 8)
+# the squares of a rank from a byte of a sight mask: " " if seen, "U" if not
+SIGHT_TEMPLATES = [
+    "".join(" " if byte >> file & 1 else "U" for file in range(8))
+    for byte in range(256)
+]
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+# Rook home squares and the castling right they guard (0: king side, 1: queen side)
+CORNERS = {
+    7: (ChessColor.WHITE, 0),
+    0: (ChessColor.WHITE, 1),
+    63: (ChessColor.BLACK, 0),
+    56: (ChessColor.BLACK, 1),
+}
+
+# (from, to, promotion, captured square, castling rook square)
+RawMove = Tuple[int, int, Optional[PieceType], Optional[int], Optional[int]]
+
+
+# Bitboards are plain ints, so taking a move back is restoring the twelve of them.
+class BitboardUndoRecord(NamedTuple):
+    move: Union[Move, RawMove]
+    bitboards: Tuple[int, ...]
+    castling: Tuple[bool, bool, bool, bool]
+    en_passant: Optional[Position]
+    halfmove_clock: int
+    fullmove_number: int
+    side_to_move: ChessColor
+    hash: int
+
+
+class BitboardBoard(Board):
+    def __init__(self, fen: Optional[str] = None, backend: str = "bitboard"):
+        if fen is None or fen == "":
+            fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"  # starting position
+        (
+            pieces_on_all_ranks,
+            side_to_move,
+            castling,
+            en_passant,
+            halfmove_clock,
+            fullmove_number,
+        ) = FenParser(fen).parse()
+        self.bitboards: List[List[int]] = [[0] * 6, [0] * 6]
+        for rank in range(1, 9):
+            for file in range(1, 9):
+                piece = pieces_on_all_ranks[8 - rank][file - 1]
+                if piece != " ":
+                    color = ChessColor.BLACK.value if piece.islower() else 0
+                    ordinal = PIECE_LETTERS[piece.lower()].ordinal
+                    self.bitboards[color][ordinal] |= 1 << ((rank - 1) * 8 + file - 1)
+        self.castling = {
+            ChessColor.WHITE: ["K" in castling, "Q" in castling],
+            ChessColor.BLACK: ["k" in castling, "q" in castling],
+        }
+        self.side_to_move = (
+            ChessColor.WHITE if side_to_move == "w" else ChessColor.BLACK
+        )
+        if en_passant == "-":
+            self.en_passant = None
+        else:
+            self.en_passant = Position.from_san(en_passant)
+        self.halfmove_clock = int(halfmove_clock)
+        self.fullmove_number = int(fullmove_number)
+        self.undo_stack: List[BitboardUndoRecord] = []
+        self.invalidate()
+
+    def set_position(
+        self,
+        masks: List[int],
+        castling: Tuple[bool, bool, bool, bool],
+        side_to_move: ChessColor,
+        en_passant: Optional[Position],
+        halfmove_clock: int,
+        fullmove_number: int,
+    ):
+        self.release_fen()
+        self.bitboards = [list(masks[:6]), list(masks[6:])]
+        self.castling = {
+            ChessColor.WHITE: [castling[0], castling[1]],
+            ChessColor.BLACK: [castling[2], castling[3]],
+        }
+        self.side_to_move = side_to_move
+        self.en_passant = en_passant
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = fullmove_number
+        self.undo_stack: List[BitboardUndoRecord] = []
+        self.invalidate()
+
+    def occupancy(self, color: int) -> int:
+        boards = self.bitboards[color]
+        return boards[0] | boards[1] | boards[2] | boards[3] | boards[4] | boards[5]
+
+    def piece_at(self, square: int) -> Optional[Tuple[int, int]]:
+        bit = 1 << square
+        for color in (0, 1):
+            for ordinal, bb in enumerate(self.bitboards[color]):
+                if bb & bit:
+                    return color, ordinal
+        return None
+
+    # FEN letter of the piece on every square, "" if empty
+    def letters(self) -> List[str]:
+        letters = [""] * 64
+        for color in (0, 1):
+            for ordinal, bb in enumerate(self.bitboards[color]):
+                letter = PIECE_CHARS[color][ordinal]
+                for square in iter_bits(bb):
+                    letters[square] = letter
+        return letters
+
+    @property
+    def pieces(self) -> Dict[Position, Piece]:
+        # A snapshot in the shape of Board.pieces; changing it does not change the board.
+        # It builds every Piece anew, so move code reads the piece table instead.
+        return {
+            SQUARES[square]: Piece(letter, SQUARES[square])
+            for square, letter in enumerate(self.letters())
+            if letter
+        }
+
+    def piece_masks(self) -> List[int]:
+        return [*self.bitboards[0], *self.bitboards[1]]
+
+    def frozen_masks(self) -> Callable[[], List[int]]:
+        masks = self.piece_masks()
+        return lambda: masks
+
+    def _placement(self, sight: int = FULL) -> str:
+        # 64 characters, " " for empty and "U" for unseen squares, whose runs of
+        # spaces then become digits, longest first
+        squares = list(
+            "".join(SIGHT_TEMPLATES[sight >> shift & 0xFF] for shift in RANK_SHIFTS)
+        )
+        for color in (0, 1):
+            for ordinal, bb in enumerate(self.bitboards[color]):
+                letter = PIECE_CHARS[color][ordinal]
+                for square in iter_bits(bb & sight):
+                    squares[square] = letter
+        placement = "/".join(
+            "".join(squares[rank * 8 : rank * 8 + 8]) for rank in range(7, -1, -1)
+        )
+        for run in range(8, 0, -1):
+            placement = placement.replace(" " * run, str(run))
+        return placement
+
+    def to_fen(self) -> str:
+        castling_str = ""
+        if self.castling[ChessColor.WHITE][0]:
+            castling_str += "K"
+        if self.castling[ChessColor.WHITE][1]:
+            castling_str += "Q"
+        if self.castling[ChessColor.BLACK][0]:
+            castling_str += "k"
+        if self.castling[ChessColor.BLACK][1]:
+            castling_str += "q"
+        return " ".join(
+            [
+                self._placement(),
+                "w" if self.side_to_move == ChessColor.WHITE else "b",
+                castling_str or "-",
+                self.en_passant.to_san() if self.en_passant else "-",
+                str(self.halfmove_clock),
+                str(self.fullmove_number),
+            ]
+        )
+
+    def compute_fow_fen(self, color: ChessColor) -> str:
+        sight = self.sight_mask(color)
+        rights = self.castling[color]
+        castling_str = ""
+        if rights[0]:
+            castling_str += "K" if color == ChessColor.WHITE else "k"
+        if rights[1]:
+            castling_str += "Q" if color == ChessColor.WHITE else "q"
+        en_passant_str = "-"
+        if self.en_passant and sight >> self.en_passant.square & 1:
+            en_passant_str = self.en_passant.to_san()
+        return " ".join(
+            [
+                self._placement(sight),
+                "w" if self.side_to_move == ChessColor.WHITE else "b",
+                castling_str or "-",
+                en_passant_str,
+                "0",  # Hide halfmove clock in FOW
+                str(self.fullmove_number),
+            ]
+        )
+
+    def _en_passant_square(self, color: int) -> Optional[int]:
+        # the en passant target square if a pawn of this color can capture on it
+        if self.en_passant is None:
+            return None
+        if self.en_passant.rank != (6 if color == 0 else 3):
+            return None
+        target = self.en_passant.square
+        victim = target - 8 if color == 0 else target + 8
+        if (
+            PAWN_ATTACKS[1 - color][target] & self.bitboards[color][PAWN]
+            and self.bitboards[1 - color][PAWN] >> victim & 1
+        ):
+            return target
+        return None
+
+    def _castling_targets(
+        self, color: int, king: int, occupied: int
+    ) -> List[Tuple[int, int]]:
+        # (king destination, rook square) for each castling move available
+        targets = []
+        rank_start = king - king % 8
+        rights = self.castling[ChessColor(color)]
+        rooks = self.bitboards[color][ROOK]
+        for side, corner, step in ((0, rank_start + 7, 2), (1, rank_start, -2)):
+            if (
+                rights[side]
+                and rooks >> corner & 1
+                and not between(king, corner) & occupied
+                and 0 <= king % 8 + step < 8
+            ):
+                targets.append((king + step, corner))
+        return targets
+
+    def invalidate(self):
+        super().invalidate()
+        # square -> (color, ordinal, sight mask, mask of squares that can change it)
+        # for sliders and kings; pawns and knights are cheap enough to redo in bulk.
+        self._piece_sights: Optional[Dict[int, Tuple[int, int, int, int]]] = None
+        # Piece objects by square for get_legal_moves, built in one pass over the
+        # bitboards; only the squares moves have changed since are redone
+        self._piece_table: Optional[List[Optional[Piece]]] = None
+        self._stale_pieces = 0  # mask of the squares to redo
+
+    def _clear_views(self):
+        super()._clear_views()
+        self._sight_masks: Dict[ChessColor, int] = {}
+
+    # Mask of the squares the player sees, kept up to date by position_changed.
+    def sight_mask(self, color: ChessColor) -> int:
+        mask = self._sight_masks.get(color)
+        if mask is not None:
+            return mask
+        if self._piece_sights is None:
+            self._piece_sights = {}
+            self._refresh_sights(FULL, True)
+        c = color.value
+        boards = self.bitboards[c]
+        own = self.occupancy(c)
+        enemy = self.occupancy(1 - c)
+        empty = ~(own | enemy) & FULL
+        pawns = boards[PAWN]
+        if c == 0:
+            single = (pawns << 8) & empty
+            double = ((single & RANK_MASKS[2]) << 8) & empty
+            attacks = (pawns & ~FILE_H) << 9 | (pawns & ~FILE_A) << 7
+        else:
+            single = (pawns >> 8) & empty
+            double = ((single & RANK_MASKS[5]) >> 8) & empty
+            attacks = (pawns & ~FILE_H) >> 7 | (pawns & ~FILE_A) >> 9
+        mask = own | single | double | (attacks & enemy)
+        en_passant = self._en_passant_square(c)
+        if en_passant is not None:
+            mask |= 1 << en_passant
+        for square in iter_bits(boards[KNIGHT]):
+            mask |= KNIGHT_ATTACKS[square]
+        for piece_color, _, piece_sight, _ in self._piece_sights.values():
+            if piece_color == c:
+                mask |= piece_sight
+        self._sight_masks[color] = mask
+        return mask
+
+    def visible_squares(self, color: ChessColor) -> FrozenSet[Position]:
+        visible = self._visible.get(color)
+        if visible is None:
+            visible = self._visible[color] = frozenset(
+                SQUARES[square] for square in iter_bits(self.sight_mask(color))
+            )
+        return visible
+
+    def position_changed(
+        self,
+        changed: int,
+        en_passant: Optional[Position],
+        castling: Tuple[bool, bool, bool, bool],
+    ):
+        self._clear_views()
+        if self._piece_sights is not None:
+            self._refresh_sights(changed, castling != self.castling_rights())
+        self._stale_pieces |= changed
+
+    def _refresh_sights(self, changed: int, kings: bool):
+        sights = self._piece_sights
+        occupied = self.occupancy(0) | self.occupancy(1)
+        for square in iter_bits(changed):
+            sights.pop(square, None)
+        for square, (color, ordinal, _, zone) in list(sights.items()):
+            if zone & changed or (kings and ordinal == KING):
+                sights[square] = self._piece_sight(color, ordinal, square, occupied)
+        for color in (0, 1):
+            for ordinal in (BISHOP, ROOK, QUEEN, KING):
+                for square in iter_bits(self.bitboards[color][ordinal] & changed):
+                    sights[square] = self._piece_sight(color, ordinal, square, occupied)
+
+    def _piece_sight(
+        self, color: int, ordinal: int, square: int, occupied: int
+    ) -> Tuple[int, int, int, int]:
+        if ordinal == KING:
+            sight = KING_ATTACKS[square]
+            for target, _ in self._castling_targets(color, square, occupied):
+                sight |= 1 << target
+            return color, ordinal, sight, RANK_MASKS[square // 8]
+        attacks = 0
+        if ordinal in (BISHOP, QUEEN):
+            attacks |= bishop_attacks(square, occupied)
+        if ordinal in (ROOK, QUEEN):
+            attacks |= rook_attacks(square, occupied)
+        return color, ordinal, attacks, attacks
+
+    # Pawn moves of color c, en passant captures last
+    def _pawn_moves(self, c: int, enemy: int, occupied: int) -> List[RawMove]:
+        pawns = self.bitboards[c][PAWN]
+        moves: List[RawMove] = []
+        append = moves.append
+        if c == 0:
+            forward, start_rank, promotion_rank = 8, 1, 6
+        else:
+            forward, start_rank, promotion_rank = -8, 6, 1
+        pawn_attacks = PAWN_ATTACKS[c]
+        for square in iter_bits(pawns):
+            rank = square // 8
+            promotions = PROMOTION_TYPES if rank == promotion_rank else NO_PROMOTION
+            one = square + forward
+            if 0 <= one < 64 and not occupied >> one & 1:
+                for promotion in promotions:
+                    append((square, one, promotion, None, None))
+                two = one + forward
+                if rank == start_rank and not occupied >> two & 1:
+                    append((square, two, None, None, None))
+            captures = pawn_attacks[square] & enemy
+            if captures:
+                for target in iter_bits(captures):
+                    for promotion in promotions:
+                        append((square, target, promotion, target, None))
+        en_passant = self._en_passant_square(c)
+        if en_passant is not None:
+            captured = en_passant - forward
+            for square in iter_bits(PAWN_ATTACKS[1 - c][en_passant] & pawns):
+                append((square, en_passant, None, captured, None))
+        return moves
+
+    # (square, ordinal, target mask) of the knights, bishops, rooks, queens and
+    # king of color c, in that order; targets leave out own pieces and castling
+    def _piece_targets(
+        self, c: int, own: int, occupied: int
+    ) -> List[Tuple[int, int, int]]:
+        boards = self.bitboards[c]
+        not_own = ~own & FULL
+        targets = [
+            (square, KNIGHT, KNIGHT_ATTACKS[square] & not_own)
+            for square in iter_bits(boards[KNIGHT])
+        ]
+        for square in iter_bits(boards[BISHOP]):
+            targets.append((square, BISHOP, bishop_attacks(square, occupied) & not_own))
+        for square in iter_bits(boards[ROOK]):
+            targets.append((square, ROOK, rook_attacks(square, occupied) & not_own))
+        for square in iter_bits(boards[QUEEN]):
+            attacks = bishop_attacks(square, occupied) | rook_attacks(square, occupied)
+            targets.append((square, QUEEN, attacks & not_own))
+        for square in iter_bits(boards[KING]):
+            targets.append((square, KING, KING_ATTACKS[square] & not_own))
+        return targets
+
+    def generate_moves(self, color: ChessColor) -> List[RawMove]:
+        c = color.value
+        own = self.occupancy(c)
+        enemy = self.occupancy(1 - c)
+        occupied = own | enemy
+        moves = self._pawn_moves(c, enemy, occupied)
+        append = moves.append
+        for square, ordinal, targets in self._piece_targets(c, own, occupied):
+            for target in iter_bits(targets):
+                capture = target if enemy >> target & 1 else None
+                append((square, target, None, capture, None))
+            if ordinal == KING:
+                for target, rook in self._castling_targets(c, square, occupied):
+                    append((square, target, None, None, rook))
+        return moves
+
+    def generate_packed(self, color: ChessColor) -> array:
+        from fow_chess.packed_move import pack_raw
+
+        pawns = self.bitboards[color.value][PAWN]
+        return array(
+            "H",
+            [
+                pack_raw(raw_move, bool(pawns >> raw_move[0] & 1))
+                for raw_move in self.generate_moves(color)
+            ],
+        )
+
+    def push_packed(self, packed: int) -> Optional[ChessColor]:
+        from fow_chess.packed_move import unpack_raw
+
+        return self.push_raw(unpack_raw(packed))
+
+    def apply_packed(self, packed: int) -> Optional[ChessColor]:
+        from fow_chess.packed_move import unpack_raw
+
+        return self.apply_raw_move(unpack_raw(packed))
+
+    # The Move of a packed move, with the Pieces of the piece table rather than
+    # the ones of a fresh pieces snapshot
+    def move_from_packed(self, packed: int) -> Move:
+        from fow_chess.packed_move import unpack_raw
+
+        from_square, to_square, promotion, capture, rook = unpack_raw(packed)
+        table = self._pieces_by_square()
+        return Move(
+            self.lazy_fen(),
+            table[from_square] or self._piece_on(from_square),
+            SQUARES[to_square],
+            None if capture is None else table[capture] or self._piece_on(capture),
+            None if rook is None else table[rook] or self._piece_on(rook),
+            promotion,
+        )
+
+    # Piece objects by square, shared by the moves of successive positions
+    def _pieces_by_square(self) -> List[Optional[Piece]]:
+        table = self._piece_table
+        if table is None:
+            table = self._piece_table = [
+                Piece(letter, SQUARES[square]) if letter else None
+                for square, letter in enumerate(self.letters())
+            ]
+        elif self._stale_pieces:
+            for square in iter_bits(self._stale_pieces):
+                table[square] = None
+        self._stale_pieces = 0
+        return table
+
+    # The Piece on an occupied square, kept in the piece table
+    def _piece_on(self, square: int) -> Piece:
+        color, ordinal = self.piece_at(square)
+        piece = Piece(PIECE_CHARS[color][ordinal], SQUARES[square])
+        self._piece_table[square] = piece
+        return piece
+
+    def get_legal_moves(self, color: ChessColor) -> Dict[Piece, List[Move]]:
+        # Moves are built straight from the target masks, with the Pieces of the
+        # piece table; only pawn moves (promotions, en passant) go through RawMoves.
+        c = color.value
+        own = self.occupancy(c)
+        enemy = self.occupancy(1 - c)
+        occupied = own | enemy
+        table = self._pieces_by_square()
+        fen = self.lazy_fen()
+        pawn_moves: Dict[int, List[Move]] = {}
+        for from_square, to_square, promotion, capture, _ in self._pawn_moves(
+            c, enemy, occupied
+        ):
+            moves = pawn_moves.get(from_square)
+            if moves is None:
+                moves = pawn_moves[from_square] = []
+            moves.append(
+                Move(
+                    fen,
+                    table[from_square] or self._piece_on(from_square),
+                    SQUARES[to_square],
+                    (
+                        None
+                        if capture is None
+                        else table[capture] or self._piece_on(capture)
+                    ),
+                    None,
+                    promotion,
+                )
+            )
+        legal_moves = {moves[0].piece: moves for moves in pawn_moves.values()}
+        for square, ordinal, targets in self._piece_targets(c, own, occupied):
+            piece = table[square] or self._piece_on(square)
+            if targets & enemy:
+                moves = [
+                    Move(
+                        fen,
+                        piece,
+                        SQUARES[target],
+                        (
+                            table[target] or self._piece_on(target)
+                            if enemy >> target & 1
+                            else None
+                        ),
+                    )
+                    for target in iter_bits(targets)
+                ]
+            else:  # most pieces capture nothing
+                moves = [
+                    Move(fen, piece, SQUARES[target]) for target in iter_bits(targets)
+                ]
+            if ordinal == KING:
+                for target, rook in self._castling_targets(c, square, occupied):
+                    rook_piece = table[rook] or self._piece_on(rook)
+                    moves.append(
+                        Move(fen, piece, SQUARES[target], castling_rook=rook_piece)
+                    )
+            if moves:
+                legal_moves[piece] = moves
+        return legal_moves
+
+    def apply_move(self, move: Move) -> Optional[ChessColor]:
+        piece = move.piece
+        target = move.capture_target
+        rook = move.castling_rook
+        return self.apply_raw_move(
+            (
+                piece.position.square,
+                move.to_position.square,
+                move.promotion_piece,
+                None if target is None else target.position.square,
+                None if rook is None else rook.position.square,
+            ),
+            (piece.color.value, piece.type.ordinal),
+            None if target is None else (target.color.value, target.type.ordinal),
+        )
+
+    # returns: same as apply_raw_move
+    def push_raw(self, raw_move: RawMove) -> Optional[ChessColor]:
+        self.undo_stack.append(self.make_undo_record(raw_move))
+        return self.apply_raw_move(raw_move)
+
+    def make_undo_record(self, move: Union[Move, RawMove]) -> BitboardUndoRecord:
+        return BitboardUndoRecord(
+            move,
+            (*self.bitboards[0], *self.bitboards[1]),
+            self.castling_rights(),
+            self.en_passant,
+            self.halfmove_clock,
+            self.fullmove_number,
+            self.side_to_move,
+            self.hash,
+        )
+
+    # returns: mask of the squares whose contents changed
+    def unmake(self, undo: BitboardUndoRecord) -> int:
+        changed = self._changed_squares(undo.bitboards)
+        self.bitboards = [list(undo.bitboards[:6]), list(undo.bitboards[6:])]
+        return changed
+
+    def _changed_squares(self, before: Tuple[int, ...]) -> int:
+        white, black = self.bitboards
+        return (
+            before[0] ^ white[0]
+            | before[1] ^ white[1]
+            | before[2] ^ white[2]
+            | before[3] ^ white[3]
+            | before[4] ^ white[4]
+            | before[5] ^ white[5]
+            | before[6] ^ black[0]
+            | before[7] ^ black[1]
+            | before[8] ^ black[2]
+            | before[9] ^ black[3]
+            | before[10] ^ black[4]
+            | before[11] ^ black[5]
+        )
+
+    # moved, captured: (color, ordinal) of the moving and the captured piece,
+    # looked up on the board if not given
+    # returns: The winner if the game is over, None otherwise
+    def apply_raw_move(
+        self,
+        raw_move: RawMove,
+        moved: Optional[Tuple[int, int]] = None,
+        captured: Optional[Tuple[int, int]] = None,
+    ) -> Optional[ChessColor]:
+        self.release_fen()
+        from_square, to_square, promotion, capture, rook = raw_move
+        color, ordinal = moved or self.piece_at(from_square)
+        boards = self.bitboards[color]
+        en_passant = self.en_passant
+        castling = self.castling_rights()
+        changed = 1 << from_square | 1 << to_square
+        if capture is None:
+            captured = None
+        else:
+            captured = captured or self.piece_at(capture)
+            self.bitboards[captured[0]][captured[1]] &= ~(1 << capture)
+            changed |= 1 << capture
+
+        boards[ordinal] &= ~(1 << from_square)
+        new_ordinal = promotion.ordinal if promotion else ordinal
+        boards[new_ordinal] |= 1 << to_square
+        keys = (
+            PIECE_KEYS[color * 6 + ordinal][from_square]
+            ^ PIECE_KEYS[color * 6 + new_ordinal][to_square]
+        )
+        if captured:
+            keys ^= PIECE_KEYS[captured[0] * 6 + captured[1]][capture]
+
+        self.en_passant = None
+        if ordinal == PAWN and abs(to_square - from_square) == 16:
+            self.en_passant = SQUARES[(from_square + to_square) // 2]
+
+        if rook is not None:
+            boards[ROOK] &= ~(1 << rook)
+            boards[ROOK] |= 1 << ((from_square + to_square) // 2)
+            changed |= 1 << rook | 1 << ((from_square + to_square) // 2)
+            keys ^= (
+                PIECE_KEYS[color * 6 + ROOK][rook]
+                ^ PIECE_KEYS[color * 6 + ROOK][(from_square + to_square) // 2]
+            )
+
+        if ordinal == KING:
+            self.castling[COLORS[color]] = [False, False]
+        for square in (from_square, to_square):
+            corner = CORNERS.get(square)
+            if corner:
+                self.castling[corner[0]][corner[1]] = False
+
+        self.side_to_move = (
+            ChessColor.WHITE
+            if self.side_to_move == ChessColor.BLACK
+            else ChessColor.BLACK
+        )
+        if self.side_to_move == ChessColor.WHITE:
+            self.fullmove_number += 1
+        if ordinal == PAWN or captured:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        self.position_changed(changed, en_passant, castling)
+        self.position_hashed(keys, en_passant, castling)
+        if captured and captured[1] == KING:
+            return COLORS[color]
+        if self.halfmove_clock >= 50 or self.repetition_count() >= 3:
+            return ChessColor.DRAW
+
+    def _planes(self) -> np.ndarray:
+        # (8, 8, 12) piece planes in the channel order of to_array
+        bits = np.unpackbits(
+            np.array(self.piece_masks(), dtype="<u8").view(np.uint8),
+            bitorder="little",
+        )
+        return bits.reshape(12, 8, 8).transpose(1, 2, 0).astype(bool)
+
+    def _fill_header(self, array: np.ndarray):
+        if self.castling[ChessColor.WHITE][0]:
+            array[:, :, 0] = 1
+        if self.castling[ChessColor.WHITE][1]:
+            array[:, :, 1] = 1
+        if self.castling[ChessColor.BLACK][0]:
+            array[:, :, 2] = 1
+        if self.castling[ChessColor.BLACK][1]:
+            array[:, :, 3] = 1
+        if self.side_to_move == ChessColor.WHITE:
+            array[:, :, 4] = 1
+        array[:, :, 6] = 1
+
+    def _mark_en_passant(self, array: np.ndarray):
+        # en passant is shown as the vulnerable pawn on the back rank
+        if self.en_passant.rank == 3:  # white is vulnerable
+            array[
+                0,
+                self.en_passant.file - 1,
+                7 + ChessColor.WHITE.value * 6 + PieceType.PAWN.ordinal,
+            ] = 1
+        else:
+            array[
+                7,
+                self.en_passant.file - 1,
+                7 + ChessColor.BLACK.value * 6 + PieceType.PAWN.ordinal,
+            ] = 1
+
+    def to_array(self) -> np.ndarray:
+        array = np.zeros((8, 8, 20), dtype=bool)
+        self._fill_header(array)
+        array[self.halfmove_clock // 8, self.halfmove_clock % 8, 5] = 1
+        array[:, :, 7:19] = self._planes()
+        if self.en_passant:
+            self._mark_en_passant(array)
+        array[:, :, 19] = self.repetition_count() >= 2
+        return array
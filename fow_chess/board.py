@@ -1,16 +1,114 @@
-from typing import Dict, List, Optional, Set
+from array import array
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 import numpy as np
 
 from fow_chess.chesscolor import ChessColor
-from fow_chess.fen_parser import FenParser
+from fow_chess.fen_parser import PIECE_PLANES, FenParser, read_fens
+from fow_chess.mailbox import Mailbox
 from fow_chess.move import Move
 from fow_chess.piece import Piece, PieceType
-from fow_chess.position import Position
+from fow_chess.position import BY_INDEX, OFF_BOARD, SQUARES, Position
+from fow_chess.tables import (
+    BETWEEN_SQUARES,
+    BISHOP_RAY_TARGETS,
+    KING_TARGETS,
+    KNIGHT_TARGETS,
+    PAWN_CAPTURE_TARGETS,
+    ROOK_RAY_TARGETS,
+    iter_bits,
+)
+from fow_chess.zobrist import (
+    BLACK_TO_MOVE_KEY,
+    PIECE_KEYS,
+    castling_key,
+    en_passant_key,
+    hash_board,
+)
+
+if TYPE_CHECKING:
+    from fow_chess.position_cache import PositionCache
+
+BACKENDS = ("default", "bitboard")
+FULL = (1 << 64) - 1
+
+# Rook home squares and the castling right they guard (0: king side, 1: queen side)
+ROOK_CORNERS = {
+    Position(rank=1, file=8): (ChessColor.WHITE, 0),
+    Position(rank=1, file=1): (ChessColor.WHITE, 1),
+    Position(rank=8, file=8): (ChessColor.BLACK, 0),
+    Position(rank=8, file=1): (ChessColor.BLACK, 1),
+}
+
+
+# What apply_move overwrites, so that Board.pop can put it back
+class UndoRecord(NamedTuple):
+    move: Move
+    from_position: Position
+    piece_type: PieceType
+    rook_position: Optional[Position]
+    castling: Tuple[bool, bool, bool, bool]
+    en_passant: Optional[Position]
+    halfmove_clock: int
+    fullmove_number: int
+    side_to_move: ChessColor
+    hash: int
+
+
+# The FEN of the position a move was generated in, built only when read. The
+# moves of one position share it; before the board moves on it hands over a
+# cheap copy of the position (see Board.release_fen), so it stays right.
+class LazyFen:
+    __slots__ = ("board", "state", "value")
+
+    def __init__(self, board: "Board"):
+        self.board: Optional[Board] = board
+        # (function building piece_masks(), castling, side, en passant, clocks)
+        self.state: Optional[tuple] = None
+        self.value: Optional[str] = None
+
+    @property
+    def fen(self) -> str:
+        if self.value is None:
+            if self.board is not None:
+                self.value = self.board.fen
+            else:
+                masks, *header = self.state
+                board = Board.__new__(Board)
+                board.set_position(masks(), *header)
+                self.value = board.to_fen()
+                self.state = None
+        return self.value
 
 
 class Board:
     en_passant: Optional[Position]
+    _lazy_fen: Optional[LazyFen] = None
+    # shared by all boards when set on the class (see fow_chess.position_cache)
+    position_cache: Optional["PositionCache"] = None
+
+    def __new__(cls, fen: Optional[str] = None, backend: str = "default"):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown board backend: {backend}")
+        if cls is Board and backend == "bitboard":
+            from fow_chess.bitboard import BitboardBoard
+
+            return super().__new__(BitboardBoard)
+        return super().__new__(cls)
 
     def to_fen(self) -> str:
         # Generate the piece placement string
@@ -19,7 +117,7 @@ class Board:
             empty_counter = 0
             rank_str = ""
             for file in range(1, 9):
-                piece = self.pieces.get(Position(rank=rank, file=file))
+                piece = self.pieces.cells[(rank - 1) * 16 + file - 1]
                 if piece:
                     if empty_counter:
                         rank_str += str(empty_counter)
@@ -70,25 +168,239 @@ class Board:
 
         return fen
 
+    @property
+    def fen(self) -> str:
+        if self._fen is None:
+            self._fen = self.to_fen()
+        return self._fen
+
+    @property
+    def fow_fen(self) -> str:
+        return self.to_fow_fen(self.side_to_move)
+
     def to_fow_fen(self, color: ChessColor) -> str:
-        # get possible moves to get sight
-        possible_moves = self.get_legal_moves(color)
-        # calculate the sight
-        sight: Set[Position] = set()
-        for piece in self.pieces.values():
-            if piece.color == color:
-                sight.add(piece.position)
-        for piece, moves in possible_moves.items():
-            for move in moves:
-                sight.add(move.to_position)
+        fow_fen = self._fow_fens.get(color)
+        if fow_fen is None:
+            cache = self.position_cache
+            if cache is None:
+                fow_fen = self.compute_fow_fen(color)
+            else:
+                key = (self.hash, "fow_fen", color.value, self.fullmove_number)
+                fow_fen = cache.get(key)
+                if fow_fen is None:
+                    fow_fen = self.compute_fow_fen(color)
+                    cache.put(key, fow_fen)
+            self._fow_fens[color] = fow_fen
+        return fow_fen
+
+    # Shared by the moves generated in the current position, see LazyFen
+    def lazy_fen(self) -> LazyFen:
+        if self._lazy_fen is None:
+            self._lazy_fen = LazyFen(self)
+        return self._lazy_fen
+
+    # Called before the position changes
+    def release_fen(self):
+        lazy_fen = self._lazy_fen
+        if lazy_fen is None:
+            return
+        if self._fen is not None:
+            lazy_fen.value = self._fen
+        elif lazy_fen.value is None:
+            lazy_fen.state = (
+                self.frozen_masks(),
+                self.castling_rights(),
+                self.side_to_move,
+                self.en_passant,
+                self.halfmove_clock,
+                self.fullmove_number,
+            )
+        lazy_fen.board = None
+        self._lazy_fen = None
+
+    # A copy of the placement, as a function returning its piece_masks()
+    def frozen_masks(self) -> Callable[[], List[int]]:
+        cells = list(self.pieces.cells)
+        # pieces are shared with moves and change type when they promote
+        types = [piece and piece.type for piece in cells]
+
+        def masks() -> List[int]:
+            result = [0] * 12
+            for index, (piece, piece_type) in enumerate(zip(cells, types)):
+                if piece is not None:
+                    plane = piece.color.value * 6 + piece_type.ordinal
+                    result[plane] |= 1 << BY_INDEX[index].square
+            return result
+
+        return masks
+
+    # Drops the cached FEN views and sight maps and starts a new hash history;
+    # call after changing the position by hand.
+    def invalidate(self):
+        self.release_fen()
+        self._clear_views()
+        self.hash = hash_board(self)
+        # hashes of every position since the last invalidate, the current one last
+        self.hash_history: List[int] = [self.hash]
+        # square -> (squares the piece there sees, squares whose contents can change that)
+        self._sight: Optional[Dict[Position, Tuple[Set[Position], ...]]] = None
+
+    def _clear_views(self):
+        self._fen = None
+        self._fow_fens: Dict[ChessColor, str] = {}
+        self._visible: Dict[ChessColor, FrozenSet[Position]] = {}
+        self._sans: Dict[ChessColor, Dict[str, Move]] = {}
+
+    # Squares the player sees: their own pieces and every square they can move to.
+    def visible_squares(self, color: ChessColor) -> FrozenSet[Position]:
+        if self._sight is None:
+            self._sight = {
+                position: self.piece_sight(piece)
+                for position, piece in self.pieces.items()
+            }
+        visible = self._visible.get(color)
+        if visible is None:
+            squares = set()
+            for position, piece in self.pieces.items():
+                if piece.color == color:
+                    squares |= self._sight[position][0]
+            visible = self._visible[color] = frozenset(squares)
+        return visible
+
+    # Called after the pieces on `changed` were replaced; recomputes only the
+    # sight of pieces that stand on, or look through, one of those squares.
+    def position_changed(
+        self,
+        changed: Set[Position],
+        en_passant: Optional[Position],
+        castling: Tuple[bool, bool, bool, bool],
+    ):
+        self._clear_views()
+        if self._sight is None:
+            return
+        en_passant_changed = en_passant != self.en_passant
+        castling_changed = castling != self.castling_rights()
+        for position in changed:
+            self._sight.pop(position, None)
+        for position, piece in self.pieces.items():
+            entry = self._sight.get(position)
+            if (
+                entry is None
+                or (en_passant_changed and piece.type == PieceType.PAWN)
+                or (castling_changed and piece.type == PieceType.KING)
+                or not entry[1].isdisjoint(changed)
+            ):
+                self._sight[position] = self.piece_sight(piece)
+
+    # Masks with bit (rank - 1) * 8 + (file - 1) set for every visible square
+    def sight_mask(self, color: ChessColor) -> int:
+        mask = 0
+        for position in self.visible_squares(color):
+            mask |= 1 << position.square
+        return mask
+
+    # One mask per piece plane of to_array (white pawn ... black king)
+    def piece_masks(self) -> List[int]:
+        masks = [0] * 12
+        for position, piece in self.pieces.items():
+            masks[piece.color.value * 6 + piece.type.ordinal] |= 1 << position.square
+        return masks
+
+    # Updates the hash after a move; keys: xor of the piece keys that were moved,
+    # en_passant and castling: the values before the move
+    def position_hashed(
+        self,
+        keys: int,
+        en_passant: Optional[Position],
+        castling: Tuple[bool, bool, bool, bool],
+    ):
+        self.hash ^= (
+            keys
+            ^ BLACK_TO_MOVE_KEY
+            ^ en_passant_key(en_passant)
+            ^ en_passant_key(self.en_passant)
+            ^ castling_key(castling)
+            ^ castling_key(self.castling_rights())
+        )
+        self.hash_history.append(self.hash)
+
+    # returns: how many times the current position has occurred, counting itself
+    def repetition_count(self) -> int:
+        # positions before the last capture or pawn move cannot come back
+        return self.hash_history[-self.halfmove_clock - 1 :].count(self.hash)
+
+    def castling_rights(self) -> Tuple[bool, bool, bool, bool]:
+        return (*self.castling[ChessColor.WHITE], *self.castling[ChessColor.BLACK])
+
+    def piece_sight(self, piece: Piece) -> Tuple[Set[Position], Set[Position]]:
+        cells = self.pieces.cells
+        index = piece.position.index
+        square = piece.position.square
+        sight = {piece.position}
+        zone = set()
+        if piece.type == PieceType.PAWN:
+            forward = 16 if piece.color == ChessColor.WHITE else -16
+            one = index + forward
+            if not one & OFF_BOARD:
+                zone.add(BY_INDEX[one])
+                if cells[one] is None:
+                    sight.add(BY_INDEX[one])
+                if piece.rank == (2 if forward > 0 else 7):
+                    zone.add(BY_INDEX[one + forward])
+                    if cells[one] is None and cells[one + forward] is None:
+                        sight.add(BY_INDEX[one + forward])
+            for target in PAWN_CAPTURE_TARGETS[piece.color.value][square]:
+                zone.add(target)
+                target_piece = cells[target.index]
+                if target_piece and target_piece.color != piece.color:
+                    sight.add(target)
+            if (
+                self.en_passant
+                and abs(piece.file - self.en_passant.file) == 1
+                and piece.rank == (5 if forward > 0 else 4)
+                and self.en_passant.rank == piece.rank + forward // 16
+                and cells[index + self.en_passant.file - piece.file] is not None
+            ):
+                sight.add(self.en_passant)
+        elif piece.type == PieceType.KNIGHT:
+            sight.update(KNIGHT_TARGETS[square])
+        elif piece.type == PieceType.KING:
+            sight.update(KING_TARGETS[square])
+            rank_start = square - piece.file + 1
+            zone.update(SQUARES[rank_start : rank_start + 8])
+            for side, corner, step in ((0, rank_start + 7, 2), (1, rank_start, -2)):
+                can_castle = self.castling[piece.color][side]
+                if not can_castle or not self.is_castling_rook(
+                    piece, cells[SQUARES[corner].index]
+                ):
+                    continue
+                if not any(cells[p.index] for p in BETWEEN_SQUARES[square][corner]):
+                    sight.add(SQUARES[square + step])
+        else:
+            rays = []
+            if piece.type in (PieceType.BISHOP, PieceType.QUEEN):
+                rays += BISHOP_RAY_TARGETS[square]
+            if piece.type in (PieceType.ROOK, PieceType.QUEEN):
+                rays += ROOK_RAY_TARGETS[square]
+            for ray in rays:
+                for target in ray:
+                    sight.add(target)
+                    zone.add(target)
+                    if cells[target.index] is not None:
+                        break
+        return sight, zone
+
+    def compute_fow_fen(self, color: ChessColor) -> str:
+        sight = self.visible_squares(color)
         # Generate the piece placement string
         ranks = []
         for rank in range(8, 0, -1):  # start from 8 to 1
             empty_counter = 0
             rank_str = ""
             for file in range(1, 9):
-                piece = self.pieces.get(Position(rank=rank, file=file))
-                if Position(rank=rank, file=file) in sight:
+                index = (rank - 1) * 16 + file - 1
+                piece = self.pieces.cells[index]
+                if BY_INDEX[index] in sight:
                     if piece:
                         if empty_counter:
                             rank_str += str(empty_counter)
@@ -145,7 +457,7 @@ class Board:
         )
         return fen
 
-    def __init__(self, fen: Optional[str] = None):
+    def __init__(self, fen: Optional[str] = None, backend: str = "default"):
         if fen is None or fen == "":
             fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"  # starting position
         (
@@ -156,12 +468,12 @@ class Board:
             self.halfmove_clock,
             self.fullmove_number,
         ) = FenParser(fen).parse()
-        self.pieces: Dict[Position, Piece] = {}
+        self.pieces = Mailbox()
         for rank in range(1, 9):
             for file in range(1, 9):
                 piece = pieces_on_all_ranks[8 - rank][file - 1]
                 if piece != " ":
-                    pos = Position(rank=rank, file=file)
+                    pos = BY_INDEX[(rank - 1) * 16 + file - 1]
                     self.pieces[pos] = Piece(piece, pos)
         self.castling = {
             ChessColor.WHITE: ["K" in castling, "Q" in castling],
@@ -176,75 +488,97 @@ class Board:
             self.en_passant = Position.from_san(en_passant)
         self.halfmove_clock = int(self.halfmove_clock)
         self.fullmove_number = int(self.fullmove_number)
-        self.fen = self.to_fen()
-        self.fow_fen = self.to_fow_fen(self.side_to_move)
-        # print("Initial fow fen = ", self.fow_fen)
-        # print("Initial fen = ", self.fen)
+        self.undo_stack: List[UndoRecord] = []
+        self.invalidate()
 
+    # Builds boards lazily, one per FEN, so that large archives can be streamed
     @classmethod
-    def from_array(cls, arr: np.ndarray, fullmove_number: int):
-        # Init empty board
-        board = cls()
-        board.pieces.clear()
-
-        # Extract castling rights
-        board.castling[ChessColor.WHITE][0] = arr[:, :, 0].any()
-        board.castling[ChessColor.WHITE][1] = arr[:, :, 1].any()
-        board.castling[ChessColor.BLACK][0] = arr[:, :, 2].any()
-        board.castling[ChessColor.BLACK][1] = arr[:, :, 3].any()
-
-        # Extract side to move
-        board.side_to_move = (
-            ChessColor.WHITE if arr[:, :, 4].any() else ChessColor.BLACK
-        )
+    def from_fens(
+        cls, fens: Iterable[str], backend: str = "default"
+    ) -> Iterator["Board"]:
+        for fen in read_fens(fens):
+            yield cls(fen, backend=backend)
 
-        # Extract pieces from their respective channels
-        for rank in range(8):
-            for file in range(8):
-                pos = Position(rank=rank + 1, file=file + 1)
-                for color in [ChessColor.WHITE, ChessColor.BLACK]:
-                    for type in PieceType:
-                        if arr[rank, file, 7 + color.value * 6 + type.ordinal]:
-                            board.pieces[pos] = Piece(
-                                piece="p", position=pos
-                            )  # FIXME: dummy piece
-                            board.pieces[pos].type = type
-                            board.pieces[pos].color = color
-
-        # Extract en passant information
-        if arr[0, :, 7 + ChessColor.WHITE.value * 6 + PieceType.PAWN.ordinal].any():
-            file = np.argmax(
-                arr[0, :, 7 + ChessColor.WHITE.value * 6 + PieceType.PAWN.ordinal]
-            )
-            board.en_passant = Position(
-                rank=3, file=file + 1
-            )  # Adjust for 0-based index
-        elif arr[7, :, 7 + ChessColor.BLACK.value * 6 + PieceType.PAWN.ordinal].any():
-            file = np.argmax(
-                arr[7, :, 7 + ChessColor.BLACK.value * 6 + PieceType.PAWN.ordinal]
-            )
-            board.en_passant = Position(
-                rank=6, file=file + 1
-            )  # Adjust for 0-based index
-        else:
-            board.en_passant = None
+    @classmethod
+    def from_array(cls, arr: np.ndarray, fullmove_number: int):
+        return cls.from_arrays(arr[None], fullmove_number)[0]
 
-        # Extract halfmove clock from its respective channel
-        positions_with_halfmove_clock = np.argwhere(arr[:, :, 5])
-        if positions_with_halfmove_clock.size > 0:
-            rank, file = positions_with_halfmove_clock[0]
-            board.halfmove_clock = rank * 8 + file
-        else:
-            board.halfmove_clock = 0
+    @classmethod
+    def from_arrays(
+        cls, arrays: np.ndarray, fullmove_numbers: Union[int, Sequence[int]] = 1
+    ) -> List["Board"]:
+        """Boards from a batch of (N, 8, 8, 20) to_array planes.
 
-        # manually set the fullmove number
-        board.fullmove_number = fullmove_number
+        The planes of the whole batch are decoded at once into one integer
+        mask per piece plane; no FEN is parsed or built on the way.
+        """
+        n = len(arrays)
+        if isinstance(fullmove_numbers, int):
+            fullmove_numbers = [fullmove_numbers] * n
+        # bit (rank - 1) * 8 + (file - 1) of each of the 12 piece planes
+        masks = (
+            np.packbits(arrays[..., 7:19].reshape(n, 64, 12), axis=1, bitorder="little")
+            .transpose(0, 2, 1)
+            .copy()
+            .view("<u8")[..., 0]
+        )
+        # en passant is shown as the vulnerable pawn on the back rank
+        white_en_passant = arrays[:, 0, :, 7 + PIECE_PLANES["P"]]
+        black_en_passant = arrays[:, 7, :, 7 + PIECE_PLANES["p"]]
+        masks[:, PIECE_PLANES["P"]] &= np.uint64(~0xFF & FULL)
+        masks[:, PIECE_PLANES["p"]] &= np.uint64(~(0xFF << 56) & FULL)
+        flags = arrays[..., :5].any(axis=(1, 2))
+        clocks = arrays[..., 5].reshape(n, 64).argmax(axis=1)
 
-        # Recalculate the FEN strings
-        board.fen = board.to_fen()
-        board.fow_fen = board.to_fow_fen(board.side_to_move)
+        boards = []
+        for i, (board_masks, fullmove_number) in enumerate(
+            zip(masks.tolist(), fullmove_numbers)
+        ):
+            if white_en_passant[i].any():
+                en_passant = BY_INDEX[2 * 16 + int(white_en_passant[i].argmax())]
+            elif black_en_passant[i].any():
+                en_passant = BY_INDEX[5 * 16 + int(black_en_passant[i].argmax())]
+            else:
+                en_passant = None
+            board = cls.__new__(cls)
+            board.set_position(
+                board_masks,
+                tuple(flags[i, :4].tolist()),
+                ChessColor.WHITE if flags[i, 4] else ChessColor.BLACK,
+                en_passant,
+                int(clocks[i]),
+                int(fullmove_number),
+            )
+            boards.append(board)
+        return boards
 
-        return board
+    # Sets up the position from one mask per piece plane (white pawn ... black king)
+    def set_position(
+        self,
+        masks: List[int],
+        castling: Tuple[bool, bool, bool, bool],
+        side_to_move: ChessColor,
+        en_passant: Optional[Position],
+        halfmove_clock: int,
+        fullmove_number: int,
+    ):
+        self.release_fen()
+        self.pieces = Mailbox()
+        for plane, mask in enumerate(masks):
+            letter = "PNBRQKpnbrqk"[plane]
+            for square in iter_bits(mask):
+                position = SQUARES[square]
+                self.pieces[position] = Piece(letter, position)
+        self.castling = {
+            ChessColor.WHITE: [castling[0], castling[1]],
+            ChessColor.BLACK: [castling[2], castling[3]],
+        }
+        self.side_to_move = side_to_move
+        self.en_passant = en_passant
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = fullmove_number
+        self.undo_stack: List[UndoRecord] = []
+        self.invalidate()
 
     def __str__(self):
         parser = FenParser(self.fow_fen, fow_mark="U")
@@ -270,6 +604,22 @@ class Board:
 
     # returns: The winner if the game is over, None otherwise
     def apply_move(self, move: Move) -> Optional[ChessColor]:
+        self.release_fen()
+        from_position = move.piece.position
+        pawn_moved = move.piece.type == PieceType.PAWN
+        plane = move.piece.color.value * 6
+        keys = PIECE_KEYS[plane + move.piece.type.ordinal][from_position.square]
+        en_passant = self.en_passant
+        castling = self.castling_rights()
+        changed = {from_position, move.to_position}
+        if move.capture_target:
+            changed.add(move.capture_target.position)
+            capture = move.capture_target
+            keys ^= PIECE_KEYS[capture.color.value * 6 + capture.type.ordinal][
+                capture.position.square
+            ]
+        if move.castling_rook:
+            changed.add(move.castling_rook.position)
         # Remove the piece from its original position.
         del self.pieces[move.piece.position]
         # Handle captures.
@@ -282,12 +632,9 @@ class Board:
             move.piece.type == PieceType.PAWN
             and abs(move.piece.rank - move.to_position.rank) == 2
         ):
-            self.en_passant = Position(
-                rank=move.piece.rank - 1
-                if move.piece.color == ChessColor.BLACK
-                else move.piece.rank + 1,
-                file=move.piece.file,
-            )
+            self.en_passant = BY_INDEX[
+                (move.piece.position.index + move.to_position.index) // 2
+            ]
         # Update the piece's position.
         move.piece.position = move.to_position
         # Add the piece to its new position.
@@ -295,49 +642,36 @@ class Board:
         # Handle promotion.
         if move.promotion_piece:
             move.piece.type = move.promotion_piece
+        keys ^= PIECE_KEYS[plane + move.piece.type.ordinal][move.to_position.square]
         # Handle castling.
         if move.castling_rook:
             # Remove the rook from its original position.
-            del self.pieces[move.castling_rook.position]
+            rook_position = move.castling_rook.position
+            del self.pieces[rook_position]
 
-            # Define new rook positions based on king's end position
-            if move.to_position == Position(
-                rank=8, file=3
-            ):  # Queenside castling for black
-                new_rook_position = Position(rank=8, file=4)
-            elif move.to_position == Position(
-                rank=8, file=7
-            ):  # Kingside castling for black
-                new_rook_position = Position(rank=8, file=6)
-            elif move.to_position == Position(
-                rank=1, file=3
-            ):  # Queenside castling for white
-                new_rook_position = Position(rank=1, file=4)
-            else:  # Kingside castling for black
-                new_rook_position = Position(rank=1, file=6)
+            # The rook lands on the square the king passed over
+            new_rook_position = BY_INDEX[
+                (from_position.index + move.to_position.index) // 2
+            ]
 
             # Update the rook's position.
             move.castling_rook.position = new_rook_position
 
             # Place the rook in its new position.
             self.pieces[new_rook_position] = move.castling_rook
+            changed.add(new_rook_position)
+            keys ^= (
+                PIECE_KEYS[plane + PieceType.ROOK.ordinal][rook_position.square]
+                ^ PIECE_KEYS[plane + PieceType.ROOK.ordinal][new_rook_position.square]
+            )
 
-        # Update castling rights if needed (move a rook or king).
-        if move.piece.type == PieceType.ROOK or move.piece.type == PieceType.KING:
-            if move.piece.color == ChessColor.WHITE:
-                if move.piece.rank == 7 and move.piece.file == 0:  # Left rook moved
-                    self.castling[ChessColor.WHITE][0] = False
-                if move.piece.rank == 7 and move.piece.file == 7:  # Right rook moved
-                    self.castling[ChessColor.WHITE][1] = False
-                if move.piece.type == PieceType.KING:
-                    self.castling[ChessColor.WHITE] = [False, False]
-            else:
-                if move.piece.rank == 0 and move.piece.file == 0:  # Left rook moved
-                    self.castling[ChessColor.BLACK][0] = False
-                if move.piece.rank == 0 and move.piece.file == 7:  # Right rook moved
-                    self.castling[ChessColor.BLACK][1] = False
-                if move.piece.type == PieceType.KING:
-                    self.castling[ChessColor.BLACK] = [False, False]
+        # Update castling rights if needed (move a king, move or capture a rook).
+        if move.piece.type == PieceType.KING:
+            self.castling[move.piece.color] = [False, False]
+        for position in (from_position, move.to_position):
+            corner = ROOK_CORNERS.get(position)
+            if corner:
+                self.castling[corner[0]][corner[1]] = False
 
         # switch side to move
         self.side_to_move = (
@@ -350,17 +684,155 @@ class Board:
             self.fullmove_number += 1
 
         # update halfmove clock
-        if move.piece.type == PieceType.PAWN or move.capture_target:
+        if pawn_moved or move.capture_target:
             self.halfmove_clock = 0
         else:
             self.halfmove_clock += 1
-        self.fow_fen = self.to_fow_fen(self.side_to_move)
-        self.fen = self.to_fen()
+        self.position_changed(changed, en_passant, castling)
+        self.position_hashed(keys, en_passant, castling)
         if move.capture_target and move.capture_target.type == PieceType.KING:
             return move.piece.color
-        if self.halfmove_clock >= 50:
+        if self.halfmove_clock >= 50 or self.repetition_count() >= 3:
             return ChessColor.DRAW
 
+    # returns: same as apply_move
+    def push(self, move: Move) -> Optional[ChessColor]:
+        self.undo_stack.append(self.make_undo_record(move))
+        return self.apply_move(move)
+
+    # returns: the move that was taken back
+    def pop(self) -> Move:
+        self.release_fen()
+        undo = self.undo_stack.pop()
+        en_passant = self.en_passant
+        castling = self.castling_rights()
+        changed = self.unmake(undo)
+        self.castling = {
+            ChessColor.WHITE: [undo.castling[0], undo.castling[1]],
+            ChessColor.BLACK: [undo.castling[2], undo.castling[3]],
+        }
+        self.en_passant = undo.en_passant
+        self.halfmove_clock = undo.halfmove_clock
+        self.fullmove_number = undo.fullmove_number
+        self.side_to_move = undo.side_to_move
+        self.hash = undo.hash
+        self.hash_history.pop()
+        self.position_changed(changed, en_passant, castling)
+        return undo.move
+
+    def make_undo_record(self, move: Move) -> UndoRecord:
+        return UndoRecord(
+            move,
+            move.piece.position,
+            move.piece.type,
+            move.castling_rook.position if move.castling_rook else None,
+            self.castling_rights(),
+            self.en_passant,
+            self.halfmove_clock,
+            self.fullmove_number,
+            self.side_to_move,
+            self.hash,
+        )
+
+    # Puts the pieces back; pop restores the rest of the state.
+    # returns: the squares whose contents changed
+    def unmake(self, undo: UndoRecord) -> Set[Position]:
+        move = undo.move
+        changed = {move.to_position, undo.from_position}
+        del self.pieces[move.to_position]
+        move.piece.position = undo.from_position
+        move.piece.type = undo.piece_type
+        self.pieces[undo.from_position] = move.piece
+        if move.castling_rook:
+            changed.update((move.castling_rook.position, undo.rook_position))
+            del self.pieces[move.castling_rook.position]
+            move.castling_rook.position = undo.rook_position
+            self.pieces[undo.rook_position] = move.castling_rook
+        if move.capture_target:
+            changed.add(move.capture_target.position)
+            self.pieces[move.capture_target.position] = move.capture_target
+        return changed
+
+    # returns: SAN -> move for every legal move of the color
+    def legal_moves_san(self, color: ChessColor) -> Dict[str, Move]:
+        sans = self._sans.get(color)
+        if sans is None:
+            moves = [
+                move for moves in self.get_legal_moves(color).values() for move in moves
+            ]
+            # origins of every (piece type, destination) pair, for disambiguation
+            origins: Dict[Tuple[PieceType, Position], List[Position]] = {}
+            for move in moves:
+                origins.setdefault((move.piece.type, move.to_position), []).append(
+                    move.piece.position
+                )
+            sans = self._sans[color] = {}
+            for move in moves:
+                rivals = [
+                    position
+                    for position in origins[move.piece.type, move.to_position]
+                    if position != move.piece.position
+                ]
+                sans[move.format_san(rivals)] = move
+        return sans
+
+    def san_of(self, move: Move) -> str:
+        key = (move.piece.position, move.to_position, move.promotion_piece)
+        for san, legal_move in self.legal_moves_san(move.piece.color).items():
+            if (
+                legal_move.piece.position,
+                legal_move.to_position,
+                legal_move.promotion_piece,
+            ) == key:
+                return san
+        return move.format_san([])
+
+    # returns: the legal moves packed into 16 bits each (see fow_chess.packed_move)
+    def legal_moves_packed(self, color: ChessColor) -> array:
+        cache = self.position_cache
+        if cache is None:
+            return self.generate_packed(color)
+        key = (self.hash, "moves", color.value)
+        moves = cache.get(key)
+        if moves is None:
+            moves = self.generate_packed(color)
+            cache.put(key, moves)
+        return array("H", moves)
+
+    def generate_packed(self, color: ChessColor) -> array:
+        from fow_chess.packed_move import pack_moves
+
+        return pack_moves(
+            move for moves in self.get_legal_moves(color).values() for move in moves
+        )
+
+    def move_from_packed(self, packed: int) -> Move:
+        from fow_chess.packed_move import unpack_move
+
+        return unpack_move(packed, self)
+
+    # returns: same as apply_move
+    def apply_packed(self, packed: int) -> Optional[ChessColor]:
+        return self.apply_move(self.move_from_packed(packed))
+
+    # returns: (ACTION_SIZE,) mask of the legal actions (see fow_chess.actions)
+    def legal_action_mask(self, color: ChessColor) -> np.ndarray:
+        from fow_chess.actions import legal_action_masks
+
+        return legal_action_masks([self], color)[0]
+
+    # the legal move of the side to move with the given action
+    def action_to_move(self, action: int) -> Move:
+        from fow_chess.actions import action_to_move
+
+        return action_to_move(self, action)
+
+    @staticmethod
+    def move_to_action(move: Move) -> int:
+        from fow_chess.actions import move_to_action
+
+        return move_to_action(move)
+
     def get_legal_moves(self, color: ChessColor) -> Dict[Piece, List[Move]]:
         legal_moves = {}
         for position, piece in self.pieces.items():
@@ -399,10 +871,11 @@ class Board:
         can_promote: bool = False,
         must_capture: bool = False,
     ) -> bool:
-        if not target.is_valid():
+        if target.index & OFF_BOARD:
             return True  # invalid target
 
-        target_piece = self.pieces.get(target)
+        target_piece = self.pieces.cells[target.index]
+        fen = self.lazy_fen()
         if target_piece is None:
             if not must_capture:
                 if can_promote:
@@ -412,9 +885,9 @@ class Board:
                         PieceType.BISHOP,
                         PieceType.KNIGHT,
                     ]:
-                        moves.append(Move(self.fen, piece, target, promotion_type=type))
+                        moves.append(Move(fen, piece, target, promotion_type=type))
                 else:
-                    moves.append(Move(self.fen, piece, target))
+                    moves.append(Move(fen, piece, target))
             return False
         else:
             if target_piece.color != piece.color and can_capture:
@@ -427,7 +900,7 @@ class Board:
                     ]:
                         moves.append(
                             Move(
-                                self.fen,
+                                fen,
                                 piece,
                                 target,
                                 capture_target=target_piece,
@@ -435,233 +908,130 @@ class Board:
                             )
                         )
                 else:
-                    moves.append(
-                        Move(self.fen, piece, target, capture_target=target_piece)
-                    )
+                    moves.append(Move(fen, piece, target, capture_target=target_piece))
             return True
 
     def get_white_pawn_moves(self, piece: Piece) -> List[Move]:
-        moves = []
         # march 1 or 2 : rank increases
-        if piece.rank == 2:  # can move two squares
+        return self.get_directed_pawn_moves(piece, 16, 2, 7)
+
+    def get_black_pawn_moves(self, piece: Piece) -> List[Move]:
+        # march 1 or 2 : rank decreases
+        return self.get_directed_pawn_moves(piece, -16, 7, 2)
+
+    # forward: 0x88 step towards the promotion rank
+    def get_directed_pawn_moves(
+        self, piece: Piece, forward: int, start_rank: int, last_rank: int
+    ) -> List[Move]:
+        moves = []
+        index = piece.position.index
+        can_promote = piece.rank == last_rank
+        if piece.rank == start_rank:  # can move two squares
             if not self.add_move_if_not_blocked(
-                moves, piece, Position(rank=3, file=piece.file), can_capture=False
+                moves, piece, BY_INDEX[index + forward], can_capture=False
             ):
                 self.add_move_if_not_blocked(
-                    moves, piece, Position(rank=4, file=piece.file), can_capture=False
+                    moves, piece, BY_INDEX[index + 2 * forward], can_capture=False
                 )
-        elif piece.rank <= 7:  # can move only one squareø
+        elif not (index + forward) & OFF_BOARD:  # can move only one square
             self.add_move_if_not_blocked(
                 moves,
                 piece,
-                Position(rank=piece.rank + 1, file=piece.file),
-                can_promote=piece.rank == 7,
+                BY_INDEX[index + forward],
+                can_promote=can_promote,
                 can_capture=False,
             )
         else:
             pass  # should have promoted
         # capture
-        self.add_move_if_not_blocked(
-            moves,
-            piece,
-            Position(rank=piece.rank + 1, file=piece.file + 1),
-            can_promote=piece.rank == 7,
-            can_capture=True,
-            must_capture=True,
-        )
-        self.add_move_if_not_blocked(
-            moves,
-            piece,
-            Position(rank=piece.rank + 1, file=piece.file - 1),
-            can_promote=piece.rank == 7,
-            can_capture=True,
-            must_capture=True,
-        )
-        if self.en_passant:  # can capture en passant
-            if (
-                abs(piece.file - self.en_passant.file) == 1
-                and piece.rank == 5
-                and self.en_passant.rank == 6
-            ):
-                moves.append(
-                    Move(
-                        self.fen,
-                        piece,
-                        self.en_passant,
-                        capture_target=self.pieces[
-                            Position(rank=5, file=self.en_passant.file)
-                        ],
-                    )
-                )
-        # promotion: auto
-        return moves
-
-    def get_black_pawn_moves(self, piece: Piece) -> List[Move]:
-        moves = []
-        # march 1 or 2 : rank decreases
-        if piece.rank == 7:  # can move two squares
-            if not self.add_move_if_not_blocked(
-                moves, piece, Position(rank=6, file=piece.file), can_capture=False
-            ):
-                self.add_move_if_not_blocked(
-                    moves, piece, Position(rank=5, file=piece.file), can_capture=False
-                )
-        elif piece.rank >= 2:  # can move only one squareø
+        for target in PAWN_CAPTURE_TARGETS[piece.color.value][piece.position.square]:
             self.add_move_if_not_blocked(
                 moves,
                 piece,
-                Position(rank=piece.rank - 1, file=piece.file),
-                can_promote=piece.rank == 2,
-                can_capture=False,
+                target,
+                can_promote=can_promote,
+                can_capture=True,
+                must_capture=True,
             )
-        else:
-            pass  # should have promoted
-        # capture
-        self.add_move_if_not_blocked(
-            moves,
-            piece,
-            Position(rank=piece.rank - 1, file=piece.file + 1),
-            can_promote=piece.rank == 2,
-            can_capture=True,
-            must_capture=True,
-        )
-        self.add_move_if_not_blocked(
-            moves,
-            piece,
-            Position(rank=piece.rank - 1, file=piece.file - 1),
-            can_promote=piece.rank == 2,
-            can_capture=True,
-            must_capture=True,
-        )
         if self.en_passant:  # can capture en passant
             if (
                 abs(piece.file - self.en_passant.file) == 1
-                and piece.rank == 4
-                and self.en_passant.rank == 3
+                and self.en_passant.rank == piece.rank + forward // 16
+                and piece.rank == start_rank + 3 * forward // 16
             ):
-                moves.append(
-                    Move(
-                        self.fen,
-                        piece,
-                        self.en_passant,
-                        capture_target=self.pieces[
-                            Position(rank=4, file=self.en_passant.file)
-                        ],
+                victim = self.pieces.cells[index + self.en_passant.file - piece.file]
+                if victim is not None:
+                    moves.append(
+                        Move(
+                            self.lazy_fen(),
+                            piece,
+                            self.en_passant,
+                            capture_target=victim,
+                        )
                     )
-                )
         # promotion: auto
         return moves
 
-    def get_knight_moves(self, piece: Piece) -> List[Move]:
+    def get_step_moves(self, piece: Piece, targets: List[Position]) -> List[Move]:
         moves = []
-        dx = [1, 2, 2, 1, -1, -2, -2, -1]
-        dy = [2, 1, -1, -2, -2, -1, 1, 2]
-        for i in range(8):
-            target = Position(rank=piece.rank + dx[i], file=piece.file + dy[i])
-            self.add_move_if_not_blocked(moves, piece, target, can_capture=True)
+        for target in targets:
+            self.add_move_if_not_blocked(moves, piece, target)
         return moves
 
-    def get_bishop_moves(self, piece: Piece) -> List[Move]:
+    # rays: squares in each direction, nearest first
+    def get_slider_moves(self, piece: Piece, rays: List[List[Position]]) -> List[Move]:
         moves = []
-        # up right
-        for i in range(1, 8):
-            target = Position(rank=piece.rank + i, file=piece.file + i)
-            if self.add_move_if_not_blocked(moves, piece, target):
-                break
-        # up left
-        for i in range(1, 8):
-            target = Position(rank=piece.rank + i, file=piece.file - i)
-            if self.add_move_if_not_blocked(moves, piece, target):
-                break
-        # down right
-        for i in range(1, 8):
-            target = Position(rank=piece.rank - i, file=piece.file + i)
-            if self.add_move_if_not_blocked(moves, piece, target):
-                break
-        # down left
-        for i in range(1, 8):
-            target = Position(rank=piece.rank - i, file=piece.file - i)
-            if self.add_move_if_not_blocked(moves, piece, target):
-                break
+        for ray in rays:
+            for target in ray:
+                if self.add_move_if_not_blocked(moves, piece, target):
+                    break
         return moves
 
+    def get_knight_moves(self, piece: Piece) -> List[Move]:
+        return self.get_step_moves(piece, KNIGHT_TARGETS[piece.position.square])
+
+    def get_bishop_moves(self, piece: Piece) -> List[Move]:
+        return self.get_slider_moves(piece, BISHOP_RAY_TARGETS[piece.position.square])
+
     def get_rook_moves(self, piece: Piece) -> List[Move]:
-        moves = []
-        # up
-        for i in range(1, 8):
-            target = Position(rank=piece.rank + i, file=piece.file)
-            if self.add_move_if_not_blocked(moves, piece, target):
-                break
-        # down
-        for i in range(1, 8):
-            target = Position(rank=piece.rank - i, file=piece.file)
-            if self.add_move_if_not_blocked(moves, piece, target):
-                break
-        # right
-        for i in range(1, 8):
-            target = Position(rank=piece.rank, file=piece.file + i)
-            if self.add_move_if_not_blocked(moves, piece, target):
-                break
-        # left
-        for i in range(1, 8):
-            target = Position(rank=piece.rank, file=piece.file - i)
-            if self.add_move_if_not_blocked(moves, piece, target):
-                break
-        return moves
+        return self.get_slider_moves(piece, ROOK_RAY_TARGETS[piece.position.square])
 
     def get_queen_moves(self, piece):
         return self.get_rook_moves(piece) + self.get_bishop_moves(piece)
 
     def get_king_moves(self, piece: Piece) -> List[Move]:
-        moves = []
-        dx = [1, 1, 1, 0, 0, -1, -1, -1]
-        dy = [1, 0, -1, 1, -1, 1, 0, -1]
-        for i in range(8):
-            target = Position(rank=piece.rank + dx[i], file=piece.file + dy[i])
-            self.add_move_if_not_blocked(moves, piece, target, can_capture=True)
+        square = piece.position.square
+        moves = self.get_step_moves(piece, KING_TARGETS[square])
+        cells = self.pieces.cells
+        rank_start = square - piece.file + 1
         # castling
-        # king side rook (right rook)
-        if self.castling[piece.color][0]:
-            right_rook = self.pieces.get(Position(rank=piece.rank, file=8))
-            if right_rook is not None:
-                # check if there are no pieces between king and rook
-                for file in range(piece.file + 1, right_rook.file):
-                    if (
-                        self.pieces.get(Position(rank=piece.rank, file=file))
-                        is not None
-                    ):
-                        break
-                else:
-                    moves.append(
-                        Move(
-                            self.fen,
-                            piece,
-                            Position(rank=piece.rank, file=piece.file + 2),
-                            castling_rook=right_rook,
-                        )
-                    )
-        # queen side rook (left rook)
-        if self.castling[piece.color][1]:
-            left_rook = self.pieces.get(Position(rank=piece.rank, file=1))
-            if left_rook is not None:
-                # check if there are no pieces between king and rook
-                for file in range(left_rook.file + 1, piece.file):
-                    if (
-                        self.pieces.get(Position(rank=piece.rank, file=file))
-                        is not None
-                    ):
-                        break
-                else:
-                    moves.append(
-                        Move(
-                            self.fen,
-                            piece,
-                            Position(rank=piece.rank, file=piece.file - 2),
-                            castling_rook=left_rook,
-                        )
+        for side, corner, step in ((0, rank_start + 7, 2), (1, rank_start, -2)):
+            # side 0: king side rook (right rook), 1: queen side rook (left rook)
+            if not self.castling[piece.color][side]:
+                continue
+            rook = cells[SQUARES[corner].index]
+            # check if there are no pieces between king and rook
+            if self.is_castling_rook(piece, rook) and not any(
+                cells[p.index] for p in BETWEEN_SQUARES[square][corner]
+            ):
+                moves.append(
+                    Move(
+                        self.lazy_fen(),
+                        piece,
+                        SQUARES[square + step],
+                        castling_rook=rook,
                     )
+                )
         return moves
 
+    @staticmethod
+    def is_castling_rook(king: Piece, rook: Optional[Piece]) -> bool:
+        return (
+            rook is not None
+            and rook.type == PieceType.ROOK
+            and rook.color == king.color
+        )
+
     def to_array(self) -> np.array:
         array = np.zeros((8, 8, 20), dtype=bool)
         if self.castling[ChessColor.WHITE][0]:
@@ -685,13 +1055,12 @@ class Board:
         # An index of this channel is set to 1 if a black knight is in the corresponding spot on the game board,
         # otherwise, it is set to 0. Similar to LeelaChessZero, en passant possibilities are represented by
         # displaying the vulnerable pawn on the 8th row instead of the 5th.
-        for rank in range(8):
-            for file in range(8):
-                piece = self.pieces.get(Position(rank=rank + 1, file=file + 1))
-                if piece:
-                    array[
-                        rank, file, 7 + piece.color.value * 6 + piece.type.ordinal
-                    ] = 1
+        for position, piece in self.pieces.items():
+            array[
+                position.rank - 1,
+                position.file - 1,
+                7 + piece.color.value * 6 + piece.type.ordinal,
+            ] = 1
         if self.en_passant:
             if self.en_passant.rank == 3:  # white is vulnerable
                 array[
@@ -707,66 +1076,19 @@ class Board:
                 ] = 1
 
         # Channel 19: represents whether a position has been seen before (whether a position is a 2-fold repetition)
-        array[:, :, 19] = 0
+        array[:, :, 19] = self.repetition_count() >= 2
         return array
 
     def to_fow_array(self, color: ChessColor) -> np.ndarray:
-        # get possible moves to get sight
-        possible_moves = self.get_legal_moves(color)
-        # calculate the sight
-        sight: Set[Position] = set()
-        for piece in self.pieces.values():
-            if piece.color == color:
-                sight.add(piece.position)
-        for piece, moves in possible_moves.items():
-            for move in moves:
-                sight.add(move.to_position)
-
-        array = np.zeros((8, 8, 20), dtype=bool)
-        if self.castling[ChessColor.WHITE][0]:
-            array[:, :, 0] = 1
-        if self.castling[ChessColor.WHITE][1]:
-            array[:, :, 1] = 1
-        if self.castling[ChessColor.BLACK][0]:
-            array[:, :, 2] = 1
-        if self.castling[ChessColor.BLACK][1]:
-            array[:, :, 3] = 1
-        if self.side_to_move == ChessColor.WHITE:
-            array[:, :, 4] = 1
-
-        # No longer using halfmove_clock for its original purpose, but to represent visibility
-        for rank in range(8):
-            for file in range(8):
-                pos = Position(rank=rank + 1, file=file + 1)
-                if pos in sight:
-                    array[rank, file, 5] = 1  # Set visibility for the position in sight
-
-        array[:, :, 6] = 1
-
-        for rank in range(8):
-            for file in range(8):
-                pos = Position(rank=rank + 1, file=file + 1)
-                if pos in sight:
-                    piece = self.pieces.get(pos)
-                    if piece:
-                        array[
-                            rank, file, 7 + piece.color.value * 6 + piece.type.ordinal
-                        ] = 1
-                # You can choose to fill unsighted locations with a specific pattern if needed
-
-        if self.en_passant and self.en_passant in sight:
-            if self.en_passant.rank == 3:  # white is vulnerable
-                array[
-                    0,
-                    self.en_passant.file - 1,
-                    7 + ChessColor.WHITE.value * 6 + PieceType.PAWN.ordinal,
-                ] = 1
-            else:
-                array[
-                    7,
-                    self.en_passant.file - 1,
-                    7 + ChessColor.BLACK.value * 6 + PieceType.PAWN.ordinal,
-                ] = 1
+        from fow_chess.encoding import encode_fow_batch
 
-        array[:, :, 19] = 0  # Adjusted for FOW
-        return array
+        cache = self.position_cache
+        if cache is None:
+            return encode_fow_batch([self], [color])[0]
+        key = (self.hash, "fow_array", color.value, self.repetition_count() >= 2)
+        planes = cache.get(key)
+        if planes is None:
+            planes = encode_fow_batch([self], [color])[0]
+            cache.put(key, planes.copy())
+            return planes
+        return planes.copy()
@@ -0,0 +1,202 @@
+# Bit-packed observation dataset: fixed-size records in raw shard files that
+# are memory-mapped for reading, plus an index.json listing the shards.
+# An observation packs each of the 20 planes of to_fow_array into 8 bytes, bit
+# (rank - 1) * 8 + (file - 1) little-endian like Board.piece_masks, so a record
+# takes 164 bytes instead of 1280 for the bool array.
+import json
+import os
+from typing import TYPE_CHECKING, Iterator, List, NamedTuple, Optional, Union
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from fow_chess.selfplay import GameRecord
+
+RECORD_DTYPE = np.dtype(
+    [
+        ("observation", np.uint8, (20, 8)),
+        ("move", "<u2"),  # packed move played from this position
+        ("result", "i1"),  # winner's ChessColor value, DRAW, or -1 if unfinished
+        ("color", "u1"),  # ChessColor value of the observing player
+    ]
+)
+INDEX_FILE = "index.json"
+FORMAT_VERSION = 1
+
+Indices = Union[slice, np.ndarray, List[int]]
+
+
+def pack_observations(observations: np.ndarray) -> np.ndarray:
+    # (N, 8, 8, 20) bool -> (N, 20, 8) uint8
+    n = len(observations)
+    return np.packbits(
+        observations.transpose(0, 3, 1, 2).reshape(n, 20, 64), axis=2, bitorder="little"
+    )
+
+
+def unpack_observations(
+    packed: np.ndarray, out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    # (N, 20, 8) uint8 -> (N, 8, 8, 20) bool, written into out if given
+    n = len(packed)
+    if out is None:
+        out = np.empty((n, 8, 8, 20), dtype=bool)
+    elif out.shape[0] < n or out.shape[1:] != (8, 8, 20):
+        raise ValueError(f"out must have shape ({n}, 8, 8, 20), got {out.shape}")
+    out = out[:n]
+    bits = np.unpackbits(packed, axis=2, bitorder="little")
+    out[:] = bits.reshape(n, 20, 8, 8).transpose(0, 2, 3, 1)
+    return out
+
+
+class Batch(NamedTuple):
+    observations: np.ndarray  # (N, 8, 8, 20) bool
+    moves: np.ndarray
+    results: np.ndarray
+    colors: np.ndarray
+
+
+class DatasetWriter:
+    """Appends records to shard-NNNNN.rec files in a directory.
+
+    A new shard is started every records_per_shard records; close() (or leaving
+    the with block) writes the index.
+    """
+
+    def __init__(self, directory: str, records_per_shard: int = 1 << 20):
+        self.directory = directory
+        self.records_per_shard = records_per_shard
+        self.counts: List[int] = []
+        self._file = None
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def shards(self) -> int:
+        return len(self.counts)
+
+    def __enter__(self) -> "DatasetWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(
+        self,
+        observations: np.ndarray,
+        moves: np.ndarray,
+        results: np.ndarray,
+        colors: np.ndarray,
+    ):
+        records = np.empty(len(observations), dtype=RECORD_DTYPE)
+        records["observation"] = pack_observations(observations)
+        records["move"] = moves
+        records["result"] = results
+        records["color"] = colors
+        while len(records):
+            if self._file is None or self.counts[-1] == self.records_per_shard:
+                self._next_shard()
+            take = self.records_per_shard - self.counts[-1]
+            self._file.write(records[:take].tobytes())
+            self.counts[-1] += len(records[:take])
+            records = records[take:]
+
+    # Writes both players' observations of every ply of a self-play game
+    def add(self, game: "GameRecord"):
+        plies = len(game.moves)
+        self.write(
+            game.observations.reshape(plies * 2, 8, 8, 20),
+            np.repeat(game.moves, 2),
+            np.full(plies * 2, game.result),
+            np.tile([0, 1], plies),
+        )
+
+    def _next_shard(self):
+        if self._file is not None:
+            self._file.close()
+        path = os.path.join(self.directory, f"shard-{len(self.counts):05d}.rec")
+        self._file = open(path, "wb")
+        self.counts.append(0)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        index = {
+            "version": FORMAT_VERSION,
+            "record_size": RECORD_DTYPE.itemsize,
+            "shards": [
+                {"file": f"shard-{i:05d}.rec", "records": count}
+                for i, count in enumerate(self.counts)
+            ],
+        }
+        with open(os.path.join(self.directory, INDEX_FILE), "w") as f:
+            json.dump(index, f, indent=1)
+
+
+class Dataset:
+    """Read-only view of a dataset directory; shards are memory-mapped, so
+    opening it reads only the index and records are paged in on access."""
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            index = json.load(f)
+        if index["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported dataset version: {index['version']}")
+        if index["record_size"] != RECORD_DTYPE.itemsize:
+            raise ValueError(f"Unexpected record size: {index['record_size']}")
+        self.shards = [
+            (
+                np.memmap(
+                    os.path.join(directory, shard["file"]),
+                    dtype=RECORD_DTYPE,
+                    mode="r",
+                    shape=(shard["records"],),
+                )
+                if shard["records"]
+                else np.empty(0, dtype=RECORD_DTYPE)
+            )
+            for shard in index["shards"]
+        ]
+        # offsets[i]: index of the first record of shard i
+        self.offsets = np.cumsum([0] + [len(shard) for shard in self.shards])
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def records(self, indices: Indices) -> np.ndarray:
+        if isinstance(indices, slice):
+            indices = np.arange(len(self))[indices]
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) and (indices.min() < 0 or indices.max() >= len(self)):
+            raise IndexError("dataset index out of range")
+        shard_ids = np.searchsorted(self.offsets, indices, side="right") - 1
+        records = np.empty(len(indices), dtype=RECORD_DTYPE)
+        for shard_id in np.unique(shard_ids):
+            selected = shard_ids == shard_id
+            records[selected] = self.shards[shard_id][
+                indices[selected] - self.offsets[shard_id]
+            ]
+        return records
+
+    def read(self, indices: Indices, out: Optional[np.ndarray] = None) -> Batch:
+        """Reads the records at indices, unpacking the observations into out
+        ((N, 8, 8, 20) bool) if given."""
+        records = self.records(indices)
+        return Batch(
+            unpack_observations(records["observation"], out),
+            records["move"],
+            records["result"],
+            records["color"],
+        )
+
+    def batches(
+        self, batch_size: int, shuffle: bool = False, seed: Optional[int] = None
+    ) -> Iterator[Batch]:
+        """Yields batches covering the dataset once. The observations of every
+        batch are unpacked into the same buffer, overwritten by the next batch."""
+        order = np.arange(len(self))
+        if shuffle:
+            np.random.default_rng(seed).shuffle(order)
+        out = np.empty((batch_size, 8, 8, 20), dtype=bool)
+        for start in range(0, len(order), batch_size):
+            yield self.read(order[start : start + batch_size], out)
@@ -0,0 +1,218 @@
+# Determinization: full positions consistent with one player's fog-of-war view.
+# Squares seen in the view keep their contents; the opponent's remaining
+# material is scattered over the unseen ("U") squares, all samples at once:
+# each sample ranks the free squares by a random key and takes the lowest.
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from fow_chess.board import Board
+from fow_chess.chesscolor import ChessColor
+from fow_chess.fen_parser import PIECE_PLANES, expand_placement
+from fow_chess.piece import PieceType
+
+START_MATERIAL = {
+    PieceType.PAWN: 8,
+    PieceType.KNIGHT: 2,
+    PieceType.BISHOP: 2,
+    PieceType.ROOK: 2,
+    PieceType.QUEEN: 1,
+    PieceType.KING: 1,
+}
+PAWN_SQUARES = np.zeros(64, dtype=bool)
+PAWN_SQUARES[8:56] = True  # pawns never stand on the first or last rank
+
+
+class Determinizer:
+    """Samples full positions behind the view `fow_fen` of player `color`.
+
+    `captured` lists the opponent pieces the player has taken (known from
+    their own move history); without it the opponent is assumed to have lost
+    nothing beyond what promotions imply. Pieces that do not fit on the unseen
+    squares are left out of that sample. Unseen squares that the view implies
+    are taken (ahead of an own pawn) are filled first. Castling rights of the
+    opponent are granted whenever king and rook stand on their home squares,
+    and the halfmove clock, hidden in the view, is 0.
+    """
+
+    def __init__(
+        self,
+        fow_fen: str,
+        color: ChessColor,
+        captured: Iterable[PieceType] = (),
+    ):
+        placement, side_to_move, castling, en_passant, _, fullmove = fow_fen.split(" ")
+        expanded = expand_placement(placement, fow_mark="U")
+        if len(expanded) != 64:
+            raise ValueError(f"Invalid FEN placement: {placement}")
+        self.color = color
+        self.fullmove_number = int(fullmove)
+        opponent = ChessColor.BLACK if color == ChessColor.WHITE else ChessColor.WHITE
+        self.opponent = opponent
+
+        # fixed planes (K, 8, 8, 20) share: header and the visible pieces
+        self.base = np.zeros((8, 8, 20), dtype=bool)
+        self.base[:, :, 4] = side_to_move == "w"
+        self.base[0, 0, 5] = True
+        self.base[:, :, 6] = True
+        own_rights = 0 if color == ChessColor.WHITE else 2
+        self.base[:, :, own_rights] = "K" in castling.upper()
+        self.base[:, :, own_rights + 1] = "Q" in castling.upper()
+
+        hidden = []
+        visible: Dict[PieceType, int] = {piece_type: 0 for piece_type in PieceType}
+        for i, char in enumerate(expanded):
+            square = (7 - i // 8) * 8 + i % 8
+            if char == "U":
+                hidden.append(square)
+            elif char != " ":
+                self.base[square // 8, square % 8, 7 + PIECE_PLANES[char]] = True
+                if char.isupper() == (opponent == ChessColor.WHITE):
+                    visible[PieceType(char.lower())] += 1
+
+        # opponent material still to place
+        remaining = dict(START_MATERIAL)
+        for piece_type in captured:
+            remaining[piece_type] -= 1
+        missing = {t: max(0, remaining[t] - visible[t]) for t in PieceType}
+        promoted = sum(
+            max(0, visible[t] - remaining[t]) for t in PieceType if t != PieceType.PAWN
+        )
+        missing[PieceType.PAWN] = max(0, missing[PieceType.PAWN] - promoted)
+
+        # the pawn that just made a double step stands behind the en passant square
+        if en_passant != "-":
+            file = ord(en_passant[0]) - ord("a")
+            rank = int(en_passant[1]) - 1
+            pawn = "P" if rank == 2 else "p"
+            pawn_square = (rank + (1 if rank == 2 else -1)) * 8 + file
+            if pawn_square in hidden:  # only the opponent's pieces can be unseen
+                hidden.remove(pawn_square)
+                self.base[pawn_square // 8, pawn_square % 8, 7 + PIECE_PLANES[pawn]] = (
+                    True
+                )
+                missing[PieceType.PAWN] = max(0, missing[PieceType.PAWN] - 1)
+            # shown as the vulnerable pawn on the back rank, as in to_array
+            self.base[0 if rank == 2 else 7, file, 7 + PIECE_PLANES[pawn]] = True
+
+        # Own pawns see diagonal squares only when an enemy stands there and the
+        # squares ahead only when they are empty, so an unseen diagonal square is
+        # empty and an unseen square ahead is taken.
+        occupied = set()
+        own_pawn = "P" if color == ChessColor.WHITE else "p"
+        forward = 8 if color == ChessColor.WHITE else -8
+        for i, char in enumerate(expanded):
+            if char != own_pawn:
+                continue
+            square = (7 - i // 8) * 8 + i % 8
+            one = square + forward
+            if not 0 <= one < 64:
+                continue
+            for side, edge in ((-1, 0), (1, 7)):
+                if square % 8 != edge and one + side in hidden:
+                    hidden.remove(one + side)
+            if one in hidden:
+                occupied.add(one)
+            elif (
+                square // 8 == (1 if forward > 0 else 6)
+                and expanded[i - forward] == " "
+                and one + forward in hidden
+            ):
+                occupied.add(one + forward)
+
+        self.hidden = np.array(hidden, dtype=np.intp)
+        self.occupied = np.isin(self.hidden, list(occupied))
+        self.king = missing[PieceType.KING] > 0
+        self.pawns = missing[PieceType.PAWN]
+        # planes of the other pieces, most valuable first so they are kept
+        # when the unseen squares run out
+        self.pieces = np.array(
+            [
+                self._plane(piece_type.value)
+                for piece_type in (
+                    PieceType.QUEEN,
+                    PieceType.ROOK,
+                    PieceType.BISHOP,
+                    PieceType.KNIGHT,
+                )
+                for _ in range(missing[piece_type])
+            ],
+            dtype=np.intp,
+        )
+
+    # channel of an opponent piece given its lower case letter
+    def _plane(self, letter: str) -> int:
+        if self.opponent == ChessColor.WHITE:
+            letter = letter.upper()
+        return 7 + PIECE_PLANES[letter]
+
+    def sample(
+        self,
+        k: int,
+        rng: Optional[np.random.Generator] = None,
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """Returns k sampled positions as (k, 8, 8, 20) planes of Board.to_array."""
+        if rng is None:
+            rng = np.random.default_rng()
+        if out is None:
+            out = np.empty((k, 8, 8, 20), dtype=bool)
+        out = out[:k]
+        out[:] = self.base
+        flat = out.reshape(k, 64, 20)
+        rows = np.arange(k)[:, None]
+        h = len(self.hidden)
+        free = np.ones((k, h), dtype=bool)
+
+        def place(count: int, planes: np.ndarray, allowed: np.ndarray, first: bool):
+            # puts planes[j] on the j-th lowest random key among allowed free
+            # squares; with first, squares known to be taken come before the rest
+            if count == 0 or h == 0:
+                return
+            keys = rng.random((k, h))
+            if first:
+                keys -= self.occupied
+            keys[~(free & allowed)] = np.inf
+            order = np.argsort(keys, axis=1)[:, :count]
+            ok = np.isfinite(np.take_along_axis(keys, order, axis=1))
+            batch, slot = np.nonzero(ok)
+            flat[batch, self.hidden[order[batch, slot]], planes[slot]] = True
+            free[rows, order] &= ~ok
+
+        everywhere = np.ones(h, dtype=bool)
+        if self.king:
+            place(1, np.array([self._plane("k")]), everywhere, False)
+        place(
+            self.pawns,
+            np.full(self.pawns, self._plane("p")),
+            PAWN_SQUARES[self.hidden],
+            True,
+        )
+        place(len(self.pieces), self.pieces, everywhere, True)
+
+        # opponent castling rights wherever king and rook are at home
+        home = 0 if self.opponent == ChessColor.WHITE else 7
+        rights = 0 if self.opponent == ChessColor.WHITE else 2
+        king_home = out[:, home, 4, self._plane("k")]
+        for offset, corner in enumerate((7, 0)):
+            possible = king_home & out[:, home, corner, self._plane("r")]
+            out[:, :, :, rights + offset] = possible[:, None, None]
+        return out
+
+    def sample_boards(
+        self, k: int, rng: Optional[np.random.Generator] = None
+    ) -> List[Board]:
+        return [
+            Board.from_array(planes, self.fullmove_number)
+            for planes in self.sample(k, rng)
+        ]
+
+
+def sample_positions(
+    fow_fen: str,
+    color: ChessColor,
+    k: int,
+    rng: Optional[np.random.Generator] = None,
+    captured: Iterable[PieceType] = (),
+) -> np.ndarray:
+    return Determinizer(fow_fen, color, captured).sample(k, rng)
@@ -0,0 +1,71 @@
+from typing import TYPE_CHECKING, Optional, Sequence, Union
+
+import numpy as np
+
+from fow_chess.chesscolor import ChessColor
+from fow_chess.piece import PieceType
+
+if TYPE_CHECKING:
+    from fow_chess.board import Board
+
+WHITE_PAWN_PLANE = ChessColor.WHITE.value * 6 + PieceType.PAWN.ordinal
+BLACK_PAWN_PLANE = ChessColor.BLACK.value * 6 + PieceType.PAWN.ordinal
+
+
+def encode_fow_batch(
+    boards: Sequence["Board"],
+    colors: Union[ChessColor, Sequence[ChessColor]],
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Writes Board.to_fow_array(color) for every board into one (N, 8, 8, 20) array.
+
+    Each board only contributes 13 integer masks (sight and the 12 piece planes)
+    and a few flags; the planes are then expanded for the whole batch at once.
+    If `out` is given, the first N entries are overwritten and returned.
+    """
+    n = len(boards)
+    if isinstance(colors, ChessColor):
+        colors = [colors] * n
+    elif len(colors) != n:
+        raise ValueError(f"Expected {n} colors, got {len(colors)}")
+    if out is None:
+        out = np.empty((n, 8, 8, 20), dtype=bool)
+    elif out.shape[0] < n or out.shape[1:] != (8, 8, 20):
+        raise ValueError(f"out must have shape ({n}, 8, 8, 20), got {out.shape}")
+    return _encode_fow_batch(boards, colors, out[:n])
+
+
+# The work of encode_fow_batch, looked up here at every call, so that the wrapper
+# of fow_chess.profiling times it whichever way callers imported encode_fow_batch
+def _encode_fow_batch(
+    boards: Sequence["Board"], colors: Sequence[ChessColor], out: np.ndarray
+) -> np.ndarray:
+    n = len(boards)
+    masks = []
+    flags = np.zeros((n, 20), dtype=bool)
+    for i, (board, color) in enumerate(zip(boards, colors)):
+        sight = board.sight_mask(color)
+        planes = [mask & sight for mask in board.piece_masks()]
+        # en passant is shown as the vulnerable pawn on the back rank
+        en_passant = board.en_passant
+        if en_passant and sight >> en_passant.square & 1:
+            if en_passant.rank == 3:  # white is vulnerable
+                planes[WHITE_PAWN_PLANE] |= 1 << (en_passant.file - 1)
+            else:
+                planes[BLACK_PAWN_PLANE] |= 1 << (56 + en_passant.file - 1)
+        masks.append([sight, *planes])
+        flags[i, :4] = board.castling_rights()
+        flags[i, 4] = board.side_to_move == ChessColor.WHITE
+        flags[i, 19] = board.repetition_count() >= 2
+    flags[:, 6] = True
+
+    bits = np.unpackbits(
+        np.array(masks, dtype="<u8").reshape(n, 13, 1).view(np.uint8),
+        axis=2,
+        bitorder="little",
+    ).reshape(n, 13, 8, 8)
+    out[:] = flags[:, None, None, :]
+    # No longer using halfmove_clock for its original purpose, but to represent visibility
+    out[..., 5] = bits[:, 0]
+    out[..., 7:19] = bits[:, 1:].transpose(0, 2, 3, 1)
+    return out
@@ -1,6 +1,39 @@
 # Modified https://github.com/tlehman/fenparser/blob/master/fenparser.py
-import re
-from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+PIECE_CHARS = "kqbnrpKQBNRP"
+# Plane of each piece letter in to_array (channel - 7): white pawn ... black king
+PIECE_PLANES = {
+    char: color * 6 + ordinal
+    for color, letters in enumerate(("PNBRQK", "pnbrqk"))
+    for ordinal, char in enumerate(letters)
+}
+# ASCII code -> plane, 12 for empty squares
+PLANE_LOOKUP = np.full(256, 12, dtype=np.uint8)
+for _char, _plane in PIECE_PLANES.items():
+    PLANE_LOOKUP[ord(_char)] = _plane
+
+_rank_tables: Dict[str, Dict[int, Optional[str]]] = {}
+
+
+# str.translate table that expands digits to spaces and drops unknown characters
+def _rank_table(fow_mark: str) -> Dict[int, Optional[str]]:
+    table = _rank_tables.get(fow_mark)
+    if table is None:
+        table = {code: None for code in range(256)}
+        for char in PIECE_CHARS + fow_mark:  # the fog mark ("U") is kept like a piece
+            table[ord(char)] = char
+        for digit in range(10):
+            table[ord(str(digit))] = " " * digit
+        table = _rank_tables[fow_mark] = table
+    return table
+
+
+# returns: the 64 squares of a placement, a8 ... h8, a7 ... h1, " " for empty
+def expand_placement(placement: str, fow_mark: str = "") -> str:
+    return placement.translate(_rank_table(fow_mark))
 
 
 class FenParser:
@@ -29,26 +62,85 @@ class FenParser:
         )
 
     def parse_rank(self, rank):
-        rank_re = re.compile(
-            f"(\d|[kqbnrpKQBNRP{self.fow_mark}])"
-        )  # TODO: Added U (Unknown)
-        piece_tokens = rank_re.findall(rank)
-        pieces = self.flatten(map(self.expand_or_noop, piece_tokens))
-        return pieces
-
-    def flatten(self, lst):
-        return list(chain(*lst))
-
-    def expand_or_noop(self, piece_str):
-        piece_re = re.compile(
-            f"([kqbnrpKQBNRP{self.fow_mark}])"
-        )  # TODO: Added U (Unknown)
-        retval: str
-        if piece_re.match(piece_str):
-            retval = piece_str
+        return list(rank.translate(_rank_table(self.fow_mark)))
+
+
+def fens_to_arrays(fens: Sequence[str], out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Parses FENs straight into the (N, 8, 8, 20) planes of Board.to_array.
+
+    The placements are expanded to 64 characters each and mapped to planes
+    through PLANE_LOOKUP for the whole batch at once; no Board is built.
+    If `out` is given, the first N entries are overwritten and returned.
+    """
+    n = len(fens)
+    if out is None:
+        out = np.empty((n, 8, 8, 20), dtype=bool)
+    elif out.shape[0] < n or out.shape[1:] != (8, 8, 20):
+        raise ValueError(f"out must have shape ({n}, 8, 8, 20), got {out.shape}")
+    out = out[:n]
+    squares = []
+    flags = np.zeros((n, 20), dtype=bool)
+    clocks = np.zeros(n, dtype=np.intp)
+    en_passant_files = []  # (fen index, file, white is vulnerable)
+    for i, fen in enumerate(fens):
+        placement, side_to_move, castling, en_passant, halfmove_clock, _ = fen.split(
+            " "
+        )
+        expanded = expand_placement(placement)
+        if len(expanded) != 64:
+            raise ValueError(f"Invalid FEN placement: {placement}")
+        squares.append(expanded)
+        flags[i, :5] = (
+            "K" in castling,
+            "Q" in castling,
+            "k" in castling,
+            "q" in castling,
+            side_to_move == "w",
+        )
+        clocks[i] = int(halfmove_clock)
+        if en_passant != "-":
+            en_passant_files.append(
+                (i, ord(en_passant[0]) - ord("a"), en_passant[1] == "3")
+            )
+    flags[:, 6] = True
+    out[:] = flags[:, None, None, :]
+    out[np.arange(n), clocks // 8, clocks % 8, 5] = True
+    if n:
+        codes = np.frombuffer("".join(squares).encode("ascii"), dtype=np.uint8)
+        # rows of the expanded placement run from rank 8 down to rank 1
+        planes = PLANE_LOOKUP[codes].reshape(n, 8, 8)[:, ::-1]
+        batch, rank, file = np.nonzero(planes != 12)
+        out[batch, rank, file, 7 + planes[batch, rank, file]] = True
+    # en passant is shown as the vulnerable pawn on the back rank
+    for i, file, white in en_passant_files:
+        if white:
+            out[i, 0, file, 7 + PIECE_PLANES["P"]] = True
         else:
-            retval = self.expand(piece_str)
-        return retval
+            out[i, 7, file, 7 + PIECE_PLANES["p"]] = True
+    return out
+
+
+def read_fens(lines: Iterable[str]) -> Iterator[str]:
+    # FENs from an open file or any iterable of lines, skipping blank lines
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def iter_fen_arrays(
+    lines: Iterable[str], batch_size: int = 4096
+) -> Iterator[np.ndarray]:
+    """Streams fens_to_arrays over the FENs in lines, batch_size at a time.
 
-    def expand(self, num_str):
-        return int(num_str) * " "
+    Every batch is written into the same buffer, overwritten by the next one.
+    """
+    out = np.empty((batch_size, 8, 8, 20), dtype=bool)
+    batch: List[str] = []
+    for fen in read_fens(lines):
+        batch.append(fen)
+        if len(batch) == batch_size:
+            yield fens_to_arrays(batch, out)
+            batch = []
+    if batch:
+        yield fens_to_arrays(batch, out)
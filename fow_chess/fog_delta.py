@@ -0,0 +1,262 @@
+# Fog-of-war views sent as differences: the server keeps what each player saw
+# last as a FogSnapshot (integer masks, no FEN) and sends the FogDelta to the
+# current one, which FogView applies on the client to rebuild to_fow_fen.
+# encode_delta packs a delta into a few bytes for the wire.
+import struct
+from typing import List, NamedTuple, Optional, Tuple
+
+from fow_chess.board import Board
+from fow_chess.chesscolor import ChessColor
+from fow_chess.tables import iter_bits
+
+# to_array piece planes (white pawn ... black king) as FEN letters
+PLANE_LETTERS = "PNBRQKpnbrqk"
+CASTLING_LETTERS = "KQkq"
+
+
+class FogHeader(NamedTuple):
+    white_to_move: bool
+    castling: int  # bit i: the right CASTLING_LETTERS[i] (own rights only)
+    en_passant: int  # square, -1 if none is visible
+    fullmove_number: int
+
+
+class FogSnapshot(NamedTuple):
+    sight: int  # mask of visible squares
+    pieces: Tuple[int, ...]  # mask of the visible pieces of each plane
+    header: Optional[FogHeader]
+
+
+EMPTY_SNAPSHOT = FogSnapshot(0, (0,) * 12, None)
+
+
+class FogDelta(NamedTuple):
+    shown: int  # mask of squares that became visible
+    hidden: int  # mask of squares that became hidden
+    moved: Tuple[Tuple[int, int], ...]  # (from, to): a piece moved within view
+    placed: Tuple[Tuple[int, int], ...]  # (square, plane): a piece appeared
+    removed: int  # mask of squares in view that became empty
+    header: Optional[FogHeader]  # None if unchanged
+
+
+def fog_snapshot(board: Board, color: ChessColor) -> FogSnapshot:
+    """What `color` sees of the board, the same as board.to_fow_fen(color)."""
+    sight = board.sight_mask(color)
+    rights = board.castling[color]
+    castling = (rights[0] | rights[1] << 1) << (2 * color.value)
+    en_passant = board.en_passant
+    return FogSnapshot(
+        sight,
+        tuple(mask & sight for mask in board.piece_masks()),
+        FogHeader(
+            board.side_to_move == ChessColor.WHITE,
+            castling,
+            (
+                en_passant.square
+                if en_passant and sight >> en_passant.square & 1
+                else -1
+            ),
+            board.fullmove_number,
+        ),
+    )
+
+
+def diff(old: FogSnapshot, new: FogSnapshot) -> FogDelta:
+    both = old.sight & new.sight
+    moved = []
+    placed = []
+    moved_from = 0
+    for plane, (before, after) in enumerate(zip(old.pieces, new.pieces)):
+        gone = before & ~after & both
+        came = after & ~before
+        if not came:
+            continue
+        # one piece of the plane left a square in view and one came: a move
+        if gone and not gone & (gone - 1) and not came & (came - 1):
+            from_sq = gone.bit_length() - 1
+            moved.append((from_sq, came.bit_length() - 1))
+            moved_from |= gone
+        else:
+            placed.extend((square, plane) for square in iter_bits(came))
+    old_occupied = new_occupied = 0
+    for before, after in zip(old.pieces, new.pieces):
+        old_occupied |= before
+        new_occupied |= after
+    return FogDelta(
+        new.sight & ~old.sight,
+        old.sight & ~new.sight,
+        tuple(moved),
+        tuple(placed),
+        old_occupied & ~new_occupied & both & ~moved_from,
+        new.header if new.header != old.header else None,
+    )
+
+
+class FogTracker:
+    """Server side: the deltas of one player's view as the game goes on."""
+
+    def __init__(self, color: ChessColor):
+        self.color = color
+        self.last = EMPTY_SNAPSHOT
+
+    # returns: the delta from the view sent last (the whole view the first time)
+    def update(self, board: Board) -> FogDelta:
+        snapshot = fog_snapshot(board, self.color)
+        delta = diff(self.last, snapshot)
+        self.last = snapshot
+        return delta
+
+
+class FogView:
+    """Client side: rebuilds the view from the deltas, starting from nothing."""
+
+    def __init__(self):
+        self.squares: List[str] = ["U"] * 64  # a letter, " " (empty) or "U"
+        self.header: Optional[FogHeader] = None
+
+    def apply(self, delta: FogDelta):
+        squares = self.squares
+        for square in iter_bits(delta.hidden):
+            squares[square] = "U"
+        for square in iter_bits(delta.shown):
+            squares[square] = " "
+        # all pieces are lifted before any is put down, so moves may chain
+        letters = [squares[from_sq] for from_sq, _ in delta.moved]
+        for from_sq, _ in delta.moved:
+            squares[from_sq] = " "
+        for (_, to_sq), letter in zip(delta.moved, letters):
+            squares[to_sq] = letter
+        for square in iter_bits(delta.removed):
+            squares[square] = " "
+        for square, plane in delta.placed:
+            squares[square] = PLANE_LETTERS[plane]
+        if delta.header is not None:
+            self.header = delta.header
+
+    @property
+    def fow_fen(self) -> str:
+        ranks = []
+        for rank in range(7, -1, -1):
+            rank_str = ""
+            empty_counter = 0
+            for letter in self.squares[rank * 8 : rank * 8 + 8]:
+                if letter == " ":
+                    empty_counter += 1
+                    continue
+                if empty_counter:
+                    rank_str += str(empty_counter)
+                    empty_counter = 0
+                rank_str += letter
+            if empty_counter:
+                rank_str += str(empty_counter)
+            ranks.append(rank_str)
+        header = self.header
+        if header is None:
+            raise ValueError("No view received yet")
+        castling = "".join(
+            letter
+            for i, letter in enumerate(CASTLING_LETTERS)
+            if header.castling >> i & 1
+        )
+        en_passant = "-"
+        if header.en_passant >= 0:
+            file, rank = header.en_passant % 8, header.en_passant // 8
+            en_passant = f"{chr(ord('a') + file)}{rank + 1}"
+        return " ".join(
+            [
+                "/".join(ranks),
+                "w" if header.white_to_move else "b",
+                castling or "-",
+                en_passant,
+                "0",
+                str(header.fullmove_number),
+            ]
+        )
+
+
+# Wire format: a byte of flags, then each present field. Square sets are a
+# count and one byte per square, or 255 and the 8-byte mask when that is shorter.
+_SHOWN, _HIDDEN, _MOVED, _PLACED, _REMOVED, _HEADER = (1 << i for i in range(6))
+_HEADER_FORMAT = struct.Struct("<BbH")  # side | castling << 1, en passant, fullmove
+
+
+def _encode_squares(mask: int) -> bytes:
+    squares = bytes(iter_bits(mask))
+    if len(squares) >= 8:
+        return b"\xff" + mask.to_bytes(8, "little")
+    return bytes([len(squares)]) + squares
+
+
+def _decode_squares(data: bytes, offset: int) -> Tuple[int, int]:
+    count = data[offset]
+    if count == 255:
+        return int.from_bytes(data[offset + 1 : offset + 9], "little"), offset + 9
+    mask = 0
+    for square in data[offset + 1 : offset + 1 + count]:
+        mask |= 1 << square
+    return mask, offset + 1 + count
+
+
+def encode_delta(delta: FogDelta) -> bytes:
+    flags = 0
+    parts = []
+    for flag, mask in ((_SHOWN, delta.shown), (_HIDDEN, delta.hidden)):
+        if mask:
+            flags |= flag
+            parts.append(_encode_squares(mask))
+    if delta.moved:
+        flags |= _MOVED
+        parts.append(
+            bytes([len(delta.moved), *(sq for move in delta.moved for sq in move)])
+        )
+    if delta.placed:
+        flags |= _PLACED
+        parts.append(
+            bytes([len(delta.placed)])
+            + bytes(b for square, plane in delta.placed for b in (square, plane))
+        )
+    if delta.removed:
+        flags |= _REMOVED
+        parts.append(_encode_squares(delta.removed))
+    if delta.header is not None:
+        flags |= _HEADER
+        header = delta.header
+        parts.append(
+            _HEADER_FORMAT.pack(
+                header.white_to_move | header.castling << 1,
+                header.en_passant,
+                header.fullmove_number,
+            )
+        )
+    return bytes([flags]) + b"".join(parts)
+
+
+def decode_delta(data: bytes) -> FogDelta:
+    flags = data[0]
+    offset = 1
+    shown = hidden = removed = 0
+    moved: Tuple[Tuple[int, int], ...] = ()
+    placed: Tuple[Tuple[int, int], ...] = ()
+    header = None
+    if flags & _SHOWN:
+        shown, offset = _decode_squares(data, offset)
+    if flags & _HIDDEN:
+        hidden, offset = _decode_squares(data, offset)
+    if flags & _MOVED:
+        count = data[offset]
+        squares = data[offset + 1 : offset + 1 + 2 * count]
+        moved = tuple(zip(squares[::2], squares[1::2]))
+        offset += 1 + 2 * count
+    if flags & _PLACED:
+        count = data[offset]
+        pairs = data[offset + 1 : offset + 1 + 2 * count]
+        placed = tuple(zip(pairs[::2], pairs[1::2]))
+        offset += 1 + 2 * count
+    if flags & _REMOVED:
+        removed, offset = _decode_squares(data, offset)
+    if flags & _HEADER:
+        side_castling, en_passant, fullmove = _HEADER_FORMAT.unpack_from(data, offset)
+        header = FogHeader(
+            bool(side_castling & 1), side_castling >> 1, en_passant, fullmove
+        )
+    return FogDelta(shown, hidden, moved, placed, removed, header)
@@ -0,0 +1,366 @@
+# Information-set Monte Carlo tree search (single observer). Every iteration
+# samples a full position consistent with the searching player's fog view,
+# walks the shared tree along the moves that are legal in that position and
+# finishes with a random playout. Tree nodes are keyed by packed move, so the
+# statistics of all determinizations add up in one tree.
+#
+#   python -m fow_chess.ismcts FOW_FEN white -n 2000 -w 8
+import argparse
+import math
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+
+from fow_chess.board import BACKENDS, Board
+from fow_chess.chesscolor import ChessColor
+from fow_chess.determinize import Determinizer
+from fow_chess.piece import PieceType
+
+# pawns, knights, bishops, rooks, queens, kings: planes of Board.piece_masks
+PIECE_VALUES = (1, 3, 3, 5, 9, 0)
+SAMPLE_BATCH = 64  # determinizations drawn at a time
+
+
+class Node:
+    __slots__ = ("mover", "visits", "wins", "available", "children")
+
+    def __init__(self, mover: int = -1):
+        self.mover = mover  # ChessColor value of the player who made the move
+        self.visits = 0
+        self.wins = 0.0  # from the mover's point of view, draws count half
+        self.available = 0  # iterations in which the move was legal
+        self.children: Dict[int, "Node"] = {}  # packed move -> node
+
+    # Adds the statistics of other (a node for the same move) to this one.
+    # Subtrees only present in other are taken over, not copied.
+    def merge(self, other: "Node"):
+        self.visits += other.visits
+        self.wins += other.wins
+        self.available += other.available
+        for move, child in other.children.items():
+            mine = self.children.get(move)
+            if mine is None:
+                self.children[move] = child
+            else:
+                mine.merge(child)
+
+    def size(self) -> int:
+        return 1 + sum(child.size() for child in self.children.values())
+
+
+class SearchResult(NamedTuple):
+    move: int  # packed move, see fow_chess.packed_move
+    san: str
+    visits: Dict[int, int]  # packed move -> visits of the root moves
+    value: float  # mean score of the chosen move, 1 is a win
+    iterations: int
+    seconds: float
+
+
+def _board_class(backend: str):
+    if backend == "bitboard":
+        from fow_chess.bitboard import BitboardBoard
+
+        return BitboardBoard
+    return Board
+
+
+# A position with the given view, to name and look up the searching side's
+# moves (which only depend on the view)
+def view_board(
+    fow_fen: str,
+    color: ChessColor,
+    captured: Iterable[PieceType] = (),
+    backend: str = "default",
+) -> Board:
+    determinizer = Determinizer(fow_fen, color, captured)
+    return _board_class(backend).from_array(
+        determinizer.sample(1)[0], determinizer.fullmove_number
+    )
+
+
+# returns: the expected score of white, from the material balance
+def material_score(board: Board) -> float:
+    masks = board.piece_masks()
+    balance = sum(
+        value * (bin(masks[plane]).count("1") - bin(masks[plane + 6]).count("1"))
+        for plane, value in enumerate(PIECE_VALUES)
+    )
+    return 1 / (1 + math.exp(-balance / 3))
+
+
+class ISMCTS:
+    """Searches the move to play from a fog-of-war view.
+
+    A search stops after `iterations` iterations or `seconds` seconds,
+    whichever comes first (at least one must be given). With workers > 1
+    the budget applies to every worker: each searches its own tree (root
+    parallelism) and the root statistics are merged at the end. With reuse,
+    the tree below the move passed to advance() seeds the next search.
+    """
+
+    def __init__(
+        self,
+        iterations: Optional[int] = 1000,
+        seconds: Optional[float] = None,
+        workers: int = 1,
+        exploration: float = 0.7,
+        playout_depth: int = 32,
+        backend: str = "default",
+        reuse: bool = True,
+        seed: Optional[int] = None,
+    ):
+        if iterations is None and seconds is None:
+            raise ValueError("A search needs an iteration or a time budget")
+        self.iterations = iterations
+        self.seconds = seconds
+        self.workers = workers
+        self.exploration = exploration
+        self.playout_depth = playout_depth
+        self.backend = backend
+        self.reuse = reuse
+        self.seed = seed
+        self.tree: Optional[Node] = None  # root of the last search
+        self._kept: Optional[Node] = None  # node of the move played since
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def __getstate__(self):
+        # sent to the workers without the trees and the pool
+        state = self.__dict__.copy()
+        state.update(tree=None, _kept=None, _pool=None)
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def reset(self):
+        self.tree = None
+        self._kept = None
+
+    # Keeps the subtree of a move played from the last searched position
+    def advance(self, move: int):
+        self._kept = None
+        if self.reuse and self.tree is not None:
+            self._kept = self.tree.children.get(move)
+        self.tree = None
+
+    def _root(self) -> Node:
+        # the opponent's reply is not known: all replies tried so far are merged
+        root = Node()
+        if self._kept is not None:
+            for reply in self._kept.children.values():
+                root.merge(reply)
+        self._kept = None
+        return root
+
+    def search(
+        self,
+        fow_fen: str,
+        color: ChessColor,
+        captured: Iterable[PieceType] = (),
+    ) -> SearchResult:
+        """Searches the position seen by `color` in `fow_fen`, `color` to move.
+
+        `captured` lists the opponent pieces taken so far (see Determinizer).
+        """
+        start = time.perf_counter()
+        captured = list(captured)
+        root = self._root()
+        seed = self.seed if self.seed is not None else random.getrandbits(32)
+        if self.workers <= 1:
+            iterations = self._run(root, fow_fen, color, captured, seed)
+        else:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers)
+            # the reused tree continues in the first worker only, so that its
+            # statistics are not counted once per worker
+            futures = [
+                self._pool.submit(
+                    _search_worker,
+                    self,
+                    root if i == 0 else Node(),
+                    fow_fen,
+                    color,
+                    captured,
+                    seed + i,
+                )
+                for i in range(self.workers)
+            ]
+            root = Node()
+            iterations = 0
+            for future in futures:
+                tree, worker_iterations = future.result()
+                root.merge(tree)
+                iterations += worker_iterations
+        self.tree = root
+        if self.seed is not None:
+            self.seed += self.workers
+
+        if not root.children:
+            raise ValueError(f"No legal moves in {fow_fen}")
+        move, node = max(root.children.items(), key=lambda item: item[1].visits)
+        board = view_board(fow_fen, color, captured, self.backend)
+        return SearchResult(
+            move,
+            board.san_of(board.move_from_packed(move)),
+            {move: child.visits for move, child in root.children.items()},
+            node.wins / max(node.visits, 1),
+            iterations,
+            time.perf_counter() - start,
+        )
+
+    # Runs iterations on root until the budget is spent; returns their number
+    def _run(
+        self,
+        root: Node,
+        fow_fen: str,
+        color: ChessColor,
+        captured: List[PieceType],
+        seed: int,
+    ) -> int:
+        rng = np.random.default_rng(seed)
+        playout_rng = random.Random(seed)
+        determinizer = Determinizer(fow_fen, color, captured)
+        board_class = _board_class(self.backend)
+        fullmove_number = determinizer.fullmove_number
+        boards: List[Board] = []
+        deadline = None if self.seconds is None else time.perf_counter() + self.seconds
+        iterations = 0
+        while self.iterations is None or iterations < self.iterations:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            if not boards:
+                boards = board_class.from_arrays(
+                    determinizer.sample(SAMPLE_BATCH, rng), fullmove_number
+                )[::-1]
+            self._iterate(root, boards.pop(), playout_rng)
+            iterations += 1
+        return iterations
+
+    def _iterate(self, root: Node, board: Board, rng: random.Random):
+        node = root
+        path = [root]
+        result = None
+        # selection and expansion
+        while result is None:
+            mover = board.side_to_move
+            moves = board.legal_moves_packed(mover)
+            if not moves:
+                result = ChessColor.DRAW
+                break
+            untried = [move for move in moves if move not in node.children]
+            for move in moves:
+                child = node.children.get(move)
+                if child is not None:
+                    child.available += 1
+            if untried:
+                move = rng.choice(untried)
+                child = node.children[move] = Node(mover.value)
+                child.available += 1
+                result = board.apply_packed(move)
+                path.append(child)
+                break
+            move = self._select(node, moves)
+            node = node.children[move]
+            path.append(node)
+            result = board.apply_packed(move)
+
+        # playout
+        depth = 0
+        while result is None and depth < self.playout_depth:
+            moves = board.legal_moves_packed(board.side_to_move)
+            if not moves:
+                result = ChessColor.DRAW
+                break
+            result = board.apply_packed(moves[rng.randrange(len(moves))])
+            depth += 1
+
+        if result is None:
+            white_score = material_score(board)
+        else:
+            white_score = {
+                ChessColor.WHITE: 1.0,
+                ChessColor.BLACK: 0.0,
+                ChessColor.DRAW: 0.5,
+            }[result]
+        for node in path:
+            node.visits += 1
+            if node.mover == ChessColor.WHITE.value:
+                node.wins += white_score
+            elif node.mover == ChessColor.BLACK.value:
+                node.wins += 1 - white_score
+
+    # UCB1 over the children whose moves are legal in this determinization,
+    # with the number of times a move was available in place of parent visits
+    def _select(self, node: Node, moves) -> int:
+        best_move = moves[0]
+        best = -1.0
+        for move in moves:
+            child = node.children[move]
+            score = child.wins / child.visits + self.exploration * math.sqrt(
+                math.log(child.available) / child.visits
+            )
+            if score > best:
+                best_move, best = move, score
+        return best_move
+
+
+def _search_worker(
+    engine: ISMCTS,
+    root: Node,
+    fow_fen: str,
+    color: ChessColor,
+    captured: List[PieceType],
+    seed: int,
+):
+    iterations = engine._run(root, fow_fen, color, captured, seed)
+    return root, iterations
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m fow_chess.ismcts",
+        description="Search the move to play from a fog-of-war view.",
+    )
+    parser.add_argument("fow_fen", help="view as given by Board.to_fow_fen")
+    parser.add_argument("color", choices=["white", "black"], help="whose view it is")
+    parser.add_argument("-n", "--iterations", type=int, help="iterations per worker")
+    parser.add_argument("-t", "--seconds", type=float, help="time budget")
+    parser.add_argument("-w", "--workers", type=int, default=1)
+    parser.add_argument("--backend", choices=BACKENDS, default="default")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    color = ChessColor.WHITE if args.color == "white" else ChessColor.BLACK
+    with ISMCTS(
+        args.iterations if args.iterations or args.seconds else 1000,
+        args.seconds,
+        args.workers,
+        backend=args.backend,
+        seed=args.seed,
+    ) as engine:
+        result = engine.search(args.fow_fen, color)
+    board = view_board(args.fow_fen, color)
+    for move, visits in sorted(result.visits.items(), key=lambda item: -item[1]):
+        print(f"{board.san_of(board.move_from_packed(move)):8s} {visits}")
+    print(
+        f"best {result.san}  value {result.value:.3f}  iterations {result.iterations}"
+        f"  time {result.seconds:.3f}s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+from typing import Iterator, List, Optional, Tuple
+
+from fow_chess.piece import Piece
+from fow_chess.position import BY_INDEX, OFF_BOARD, Position
+
+
+# Board squares as a flat 0x88 list, with the get/[]/in/items() interface that
+# Board.pieces had as a Dict[Position, Piece]. Off-board positions are never
+# present, so callers do not need Position.is_valid before a lookup.
+class Mailbox:
+    __slots__ = ("cells",)
+
+    def __init__(self):
+        self.cells: List[Optional[Piece]] = [None] * 128
+
+    def get(self, position: Position, default: Optional[Piece] = None):
+        index = position.index
+        if index & OFF_BOARD:
+            return default
+        piece = self.cells[index]
+        return default if piece is None else piece
+
+    def __getitem__(self, position: Position) -> Piece:
+        piece = self.get(position)
+        if piece is None:
+            raise KeyError(position)
+        return piece
+
+    def __setitem__(self, position: Position, piece: Piece):
+        if position.index & OFF_BOARD:
+            raise KeyError(position)
+        self.cells[position.index] = piece
+
+    def __delitem__(self, position: Position):
+        if self.get(position) is None:
+            raise KeyError(position)
+        self.cells[position.index] = None
+
+    def __contains__(self, position: Position) -> bool:
+        return self.get(position) is not None
+
+    def __len__(self) -> int:
+        return len(self.values())
+
+    def __iter__(self) -> Iterator[Position]:
+        return iter(self.keys())
+
+    def keys(self) -> List[Position]:
+        return [BY_INDEX[i] for i, piece in enumerate(self.cells) if piece is not None]
+
+    def values(self) -> List[Piece]:
+        return [piece for piece in self.cells if piece is not None]
+
+    def items(self) -> List[Tuple[Position, Piece]]:
+        return [
+            (BY_INDEX[i], piece)
+            for i, piece in enumerate(self.cells)
+            if piece is not None
+        ]
+
+    def clear(self):
+        self.cells = [None] * 128
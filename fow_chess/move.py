@@ -1,13 +1,25 @@
-from typing import Optional
+from typing import TYPE_CHECKING, List, Optional, Union
 
 from fow_chess.piece import Piece, PieceType
 from fow_chess.position import Position
 
+if TYPE_CHECKING:
+    from fow_chess.board import Board, LazyFen
+
 
 class Move:
+    __slots__ = (
+        "piece",
+        "to_position",
+        "castling_rook",
+        "promotion_piece",
+        "capture_target",
+        "_fen",
+    )
+
     def __init__(
         self,
-        current_fen: str,
+        current_fen: Union[str, "LazyFen"],
         piece: Piece,
         to_position: Position,
         capture_target: Optional[Piece] = None,
@@ -19,14 +31,29 @@ class Move:
         self.castling_rook = castling_rook
         self.promotion_piece = promotion_type
         self.capture_target = capture_target
-        self.current_fen = current_fen
+        self._fen = current_fen  # boards pass a LazyFen, built when read
+
+    @property
+    def current_fen(self) -> str:
+        fen = self._fen
+        return fen if isinstance(fen, str) else fen.fen
 
-    def to_san(self):
+    # board: the board the move was generated on, if at hand; saves re-parsing current_fen.
+    # Without it, the originating board is used while its position is unchanged.
+    def to_san(self, board: Optional["Board"] = None) -> str:
         from fow_chess.board import Board
 
-        board = Board(self.current_fen)
-        san = ""
+        origin = getattr(self._fen, "board", None)  # None once the LazyFen released it
+        if board is None:
+            board = origin
+        elif board is not origin and board.fen != self.current_fen:
+            board = None
+        if board is None:
+            board = Board(self.current_fen)
+        return board.san_of(self)
 
+    # rivals: squares of other pieces of the same type that can also move to to_position
+    def format_san(self, rivals: List[Position]) -> str:
         # For handling castling
         if self.castling_rook is not None:
             if self.castling_rook.file > self.piece.file:  # Kingside
@@ -34,34 +61,18 @@ class Move:
             else:  # Queenside
                 return "O-O-O"
 
-        # Determine if there's ambiguity
-        ambiguous_moves = []
-        if self.piece.type != PieceType.PAWN:
-            for f in range(1, 9):  # Assuming 1-based indexing
-                for r in range(1, 9):
-                    other_piece = board.pieces.get(Position(file=f, rank=r))
-                    if other_piece == self.piece:  # We found our own piece
-                        continue
-                    if (
-                        other_piece
-                        and other_piece.type == self.piece.type
-                        and other_piece.color == self.piece.color
-                    ):
-                        possible_move = other_piece.generate_move(
-                            self.current_fen, board, self.to_position
-                        )  # Assuming pieces have such a method
-                        if possible_move:
-                            ambiguous_moves.append((f, r))
-
+        san = ""
         if self.piece.type != PieceType.PAWN:
-            san += self.piece.type.value
+            san += self.piece.type.value.upper()
 
             # Handle ambiguities
-            if len(ambiguous_moves) > 1:
-                if all(m[0] == self.piece.file for m in ambiguous_moves):
+            if rivals:
+                if all(rival.file != self.piece.file for rival in rivals):
+                    san += chr(ord("a") + self.piece.file - 1)
+                elif all(rival.rank != self.piece.rank for rival in rivals):
                     san += str(self.piece.rank)
                 else:
-                    san += chr(ord("a") + self.piece.file - 1)
+                    san += self.piece.position.to_san()
 
         if self.capture_target is not None:
             if self.piece.type == PieceType.PAWN:
@@ -71,7 +82,7 @@ class Move:
         san += self.to_position.to_san()
 
         if self.promotion_piece is not None:
-            san += "=" + self.promotion_piece.value
+            san += "=" + self.promotion_piece.value.upper()
 
         return san
 
@@ -0,0 +1,150 @@
+# Moves packed into 16 bits: flags << 12 | to square << 6 | from square, where a
+# square is (rank - 1) * 8 + (file - 1). Packed moves hold no references to the
+# board, so they stay valid after it changes and fit in array("H") / np.uint16.
+from array import array
+from typing import TYPE_CHECKING, Iterable, List, Optional
+
+import numpy as np
+
+from fow_chess.bitboard import RawMove
+from fow_chess.move import Move
+from fow_chess.piece import PieceType
+from fow_chess.position import Position
+
+if TYPE_CHECKING:
+    from fow_chess.board import Board
+
+QUIET = 0
+DOUBLE_PAWN_PUSH = 1
+KING_CASTLE = 2
+QUEEN_CASTLE = 3
+CAPTURE = 4
+EN_PASSANT = 5
+# PROMOTION | index in PROMOTION_TYPES, plus CAPTURE for capturing promotions
+PROMOTION = 8
+
+PROMOTION_TYPES = [PieceType.KNIGHT, PieceType.BISHOP, PieceType.ROOK, PieceType.QUEEN]
+PROMOTION_INDEX = {piece_type: i for i, piece_type in enumerate(PROMOTION_TYPES)}
+
+
+def pack(from_sq: int, to_sq: int, move_flags: int = QUIET) -> int:
+    return move_flags << 12 | to_sq << 6 | from_sq
+
+
+def from_square(packed: int) -> int:
+    return packed & 0x3F
+
+
+def to_square(packed: int) -> int:
+    return packed >> 6 & 0x3F
+
+
+def flags(packed: int) -> int:
+    return packed >> 12
+
+
+def is_capture(packed: int) -> bool:
+    return bool(packed >> 12 & CAPTURE)
+
+
+def promotion_type(packed: int) -> Optional[PieceType]:
+    if packed >> 12 & PROMOTION:
+        return PROMOTION_TYPES[packed >> 12 & 3]
+    return None
+
+
+def _flags(
+    from_sq: int,
+    to_sq: int,
+    promotion: Optional[PieceType],
+    capture_sq: Optional[int],
+    castling: bool,
+    pawn: bool,
+) -> int:
+    if castling:
+        return KING_CASTLE if to_sq > from_sq else QUEEN_CASTLE
+    if promotion is not None:
+        return (
+            PROMOTION
+            | PROMOTION_INDEX[promotion]
+            | (CAPTURE if capture_sq is not None else 0)
+        )
+    if capture_sq is not None:
+        return EN_PASSANT if capture_sq != to_sq else CAPTURE
+    if pawn and abs(to_sq - from_sq) == 16:
+        return DOUBLE_PAWN_PUSH
+    return QUIET
+
+
+def pack_move(move: Move) -> int:
+    from_sq = move.piece.position.square
+    to_sq = move.to_position.square
+    return pack(
+        from_sq,
+        to_sq,
+        _flags(
+            from_sq,
+            to_sq,
+            move.promotion_piece,
+            move.capture_target.position.square if move.capture_target else None,
+            move.castling_rook is not None,
+            move.piece.type == PieceType.PAWN,
+        ),
+    )
+
+
+def pack_raw(raw_move: RawMove, pawn: bool = False) -> int:
+    from_sq, to_sq, promotion, capture_sq, rook_sq = raw_move
+    return pack(
+        from_sq,
+        to_sq,
+        _flags(from_sq, to_sq, promotion, capture_sq, rook_sq is not None, pawn),
+    )
+
+
+def unpack_raw(packed: int) -> RawMove:
+    from_sq = packed & 0x3F
+    to_sq = packed >> 6 & 0x3F
+    move_flags = packed >> 12
+    rank_start = from_sq - from_sq % 8
+    capture_sq = None
+    rook_sq = None
+    if move_flags == EN_PASSANT:
+        capture_sq = rank_start + to_sq % 8
+    elif move_flags & CAPTURE:
+        capture_sq = to_sq
+    elif move_flags == KING_CASTLE:
+        rook_sq = rank_start + 7
+    elif move_flags == QUEEN_CASTLE:
+        rook_sq = rank_start
+    return from_sq, to_sq, promotion_type(packed), capture_sq, rook_sq
+
+
+def unpack_move(packed: int, board: "Board") -> Move:
+    from_sq, to_sq, promotion, capture_sq, rook_sq = unpack_raw(packed)
+    pieces = board.pieces
+    return Move(
+        board.lazy_fen(),
+        pieces[Position.from_square(from_sq)],
+        Position.from_square(to_sq),
+        capture_target=(
+            None if capture_sq is None else pieces[Position.from_square(capture_sq)]
+        ),
+        castling_rook=(
+            None if rook_sq is None else pieces[Position.from_square(rook_sq)]
+        ),
+        promotion_type=promotion,
+    )
+
+
+def pack_moves(moves: Iterable[Move]) -> array:
+    return array("H", map(pack_move, moves))
+
+
+def unpack_moves(packed_moves: Iterable[int], board: "Board") -> List[Move]:
+    return [unpack_move(int(packed), board) for packed in packed_moves]
+
+
+def as_numpy(packed_moves: array) -> np.ndarray:
+    # zero-copy view of a packed move array
+    return np.frombuffer(packed_moves, dtype=np.uint16)
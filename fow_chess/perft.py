@@ -0,0 +1,221 @@
+# Perft: counts the move sequences of a given length from a position, to check
+# and time move generation. Games end when a king is captured, so a move that
+# ends the game has no children; counts therefore differ from standard chess
+# perft from depth 3 or 4 on, and REFERENCE_POSITIONS holds this engine's counts.
+#
+#   python -m fow_chess.perft [FEN] -d 4 [--backend bitboard] [--divide -j 8] [--fog]
+#   python -m fow_chess.perft --check
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from fow_chess.board import BACKENDS, Board
+from fow_chess.chesscolor import ChessColor
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# (name, FEN, node counts for depth 1, 2, ...)
+REFERENCE_POSITIONS: List[Tuple[str, str, List[int]]] = [
+    ("start", START_FEN, [20, 400, 8902, 197742]),
+    (
+        "kiwipete",
+        "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        [48, 2049, 98903, 4206146],
+    ),
+    ("endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [16, 278, 4840, 88813]),
+    (
+        "promotions",
+        "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+        [38, 1845, 71811, 3500218],
+    ),
+    (
+        "castling",
+        "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+        [44, 1552, 71104, 2590828],
+    ),
+]
+
+
+class FogCounts(NamedTuple):
+    nodes: int
+    white_views: int  # distinct to_fow_fen(WHITE) among the positions at this depth
+    black_views: int
+
+
+def perft(board: Board, depth: int) -> int:
+    if depth == 0:
+        return 1
+    nodes = 0
+    for moves in board.get_legal_moves(board.side_to_move).values():
+        if depth == 1:
+            nodes += len(moves)
+            continue
+        for move in moves:
+            if board.push(move) is None:
+                nodes += perft(board, depth - 1)
+            board.pop()
+    return nodes
+
+
+def _fog_walk(
+    board: Board, depth: int, nodes: List[int], views: List[Tuple[Set[str], ...]]
+):
+    ply = len(nodes) - depth
+    for moves in board.get_legal_moves(board.side_to_move).values():
+        for move in moves:
+            result = board.push(move)
+            nodes[ply] += 1
+            views[ply][0].add(board.to_fow_fen(ChessColor.WHITE))
+            views[ply][1].add(board.to_fow_fen(ChessColor.BLACK))
+            if result is None and depth > 1:
+                _fog_walk(board, depth - 1, nodes, views)
+            board.pop()
+
+
+def _fog_sets(board: Board, depth: int) -> Tuple[List[int], List[Tuple[Set[str], ...]]]:
+    nodes = [0] * depth
+    views = [(set(), set()) for _ in range(depth)]
+    if depth > 0:
+        _fog_walk(board, depth, nodes, views)
+    return nodes, views
+
+
+# returns: counts for depth 1 .. depth
+def fog_perft(board: Board, depth: int) -> List[FogCounts]:
+    nodes, views = _fog_sets(board, depth)
+    return [
+        FogCounts(n, len(white), len(black)) for n, (white, black) in zip(nodes, views)
+    ]
+
+
+def _divide_root(fen: str, backend: str, packed: int, depth: int, fog: bool):
+    board = Board(fen, backend=backend)
+    move = board.move_from_packed(packed)
+    san = board.san_of(move)
+    ended = board.push(move) is not None
+    if fog:
+        nodes, views = _fog_sets(board, 0 if ended else depth - 1)
+        white = board.to_fow_fen(ChessColor.WHITE)
+        black = board.to_fow_fen(ChessColor.BLACK)
+        return san, [1, *nodes], [({white}, {black}), *views]
+    return san, 1 if depth == 1 else 0 if ended else perft(board, depth - 1)
+
+
+def divide(
+    fen: str,
+    depth: int,
+    backend: str = "default",
+    workers: Optional[int] = None,
+) -> Dict[str, int]:
+    """Perft of every root move, with the root moves spread over a process pool.
+
+    Returns SAN -> node count; the counts add up to perft(board, depth).
+    """
+    board = Board(fen, backend=backend)
+    packed_moves = board.legal_moves_packed(board.side_to_move)
+    with ProcessPoolExecutor(workers) as pool:
+        results = pool.map(
+            _divide_root,
+            *zip(*[(fen, backend, packed, depth, False) for packed in packed_moves]),
+        )
+        return dict(results)
+
+
+def fog_divide(
+    fen: str,
+    depth: int,
+    backend: str = "default",
+    workers: Optional[int] = None,
+) -> List[FogCounts]:
+    """fog_perft with the root moves spread over a process pool."""
+    board = Board(fen, backend=backend)
+    packed_moves = board.legal_moves_packed(board.side_to_move)
+    nodes = [0] * depth
+    views = [(set(), set()) for _ in range(depth)]
+    with ProcessPoolExecutor(workers) as pool:
+        for _, root_nodes, root_views in pool.map(
+            _divide_root,
+            *zip(*[(fen, backend, packed, depth, True) for packed in packed_moves]),
+        ):
+            for ply, (count, (white, black)) in enumerate(zip(root_nodes, root_views)):
+                nodes[ply] += count
+                views[ply][0].update(white)
+                views[ply][1].update(black)
+    return [
+        FogCounts(n, len(white), len(black)) for n, (white, black) in zip(nodes, views)
+    ]
+
+
+# returns: (name, depth, expected, actual) for every count that does not match
+def check_reference(
+    backend: str = "default", max_depth: Optional[int] = None
+) -> List[Tuple[str, int, int, int]]:
+    failures = []
+    for name, fen, expected_counts in REFERENCE_POSITIONS:
+        for depth, expected in enumerate(expected_counts[:max_depth], start=1):
+            actual = perft(Board(fen, backend=backend), depth)
+            if actual != expected:
+                failures.append((name, depth, expected, actual))
+    return failures
+
+
+def _report(nodes: int, elapsed: float):
+    print(f"nodes {nodes}  time {elapsed:.3f}s  nps {nodes / max(elapsed, 1e-9):.0f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m fow_chess.perft", description="Count move sequences to a depth."
+    )
+    parser.add_argument("fen", nargs="?", default=START_FEN)
+    parser.add_argument("-d", "--depth", type=int, default=3)
+    parser.add_argument("--backend", choices=BACKENDS, default="default")
+    parser.add_argument(
+        "--divide", action="store_true", help="count per root move in a process pool"
+    )
+    parser.add_argument("-j", "--workers", type=int, help="pool size for --divide")
+    parser.add_argument(
+        "--fog", action="store_true", help="also count distinct fog views per depth"
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="compare the reference positions up to --depth with their expected counts",
+    )
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.check:
+        failures = check_reference(args.backend, args.depth)
+        for name, depth, expected, actual in failures:
+            print(f"{name} depth {depth}: expected {expected}, got {actual}")
+        print(f"{'FAILED' if failures else 'ok'} in {time.perf_counter() - start:.3f}s")
+        return 1 if failures else 0
+
+    if args.fog:
+        if args.divide:
+            counts = fog_divide(args.fen, args.depth, args.backend, args.workers)
+        else:
+            counts = fog_perft(Board(args.fen, backend=args.backend), args.depth)
+        elapsed = time.perf_counter() - start
+        for depth, (nodes, white, black) in enumerate(counts, start=1):
+            print(
+                f"depth {depth}: nodes {nodes}  white views {white}  black views {black}"
+            )
+        _report(sum(c.nodes for c in counts), elapsed)
+    elif args.divide:
+        counts = divide(args.fen, args.depth, args.backend, args.workers)
+        elapsed = time.perf_counter() - start
+        for san, nodes in counts.items():
+            print(f"{san}: {nodes}")
+        _report(sum(counts.values()), elapsed)
+    else:
+        nodes = perft(Board(args.fen, backend=args.backend), args.depth)
+        _report(nodes, time.perf_counter() - start)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,346 @@
+# Game archives in PGN. Each move may carry both players' fog-of-war views after
+# it in a comment, {[%fow_w <to_fow_fen(WHITE)>] [%fow_b <to_fow_fen(BLACK)>]},
+# which other PGN tools keep as an ordinary comment. Archives are read one game
+# at a time, so memory does not grow with the file; map_archive splits a file
+# into byte ranges processed in parallel.
+#
+#   python -m fow_chess.pgn games.pgn [-w 8]        # count games and plies
+import argparse
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    TextIO,
+    Tuple,
+)
+
+from fow_chess.board import Board
+from fow_chess.chesscolor import ChessColor
+from fow_chess.move import Move
+from fow_chess.replay import Replay
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+RESULTS = {
+    ChessColor.WHITE: "1-0",
+    ChessColor.BLACK: "0-1",
+    ChessColor.DRAW: "1/2-1/2",
+    None: "*",
+}
+RESULT_COLORS = {text: color for color, text in RESULTS.items()}
+
+_TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_TOKEN = re.compile(
+    r"\{[^}]*\}"  # comment
+    r"|;[^\n]*"  # rest of line comment
+    r"|\(|\)"  # variations (skipped)
+    r"|\$\d+"  # NAG
+    r"|\d+\.(?:\.\.)?"  # move number
+    r"|1-0|0-1|1/2-1/2|\*"
+    r"|[^\s{}();$]+"
+)
+_VIEW = re.compile(r"\[%fow_([wb])\s+([^\]]*?)\s*\]")
+
+
+class PgnGame(NamedTuple):
+    headers: Dict[str, str]
+    moves: List[str]  # SAN
+    # per move: (white view, black view) after it, if the archive has them
+    views: List[Optional[Tuple[str, str]]]
+    result: Optional[ChessColor]
+
+    @property
+    def fen(self) -> str:
+        return self.headers.get("FEN", START_FEN)
+
+    def positions(self, backend: str = "default") -> Iterator[Tuple[Board, Move]]:
+        """Plays the game on one board: yields the board before each move and
+        the move. The board changes after each step; copy what you keep."""
+        board = Board(self.fen, backend=backend)
+        for move in self._moves(board):
+            yield board, move
+            board.apply_move(move)
+
+    def replay(self, backend: str = "default") -> Replay:
+        replay = Replay(self.fen, backend)
+        for move in self._moves(replay.board):
+            replay.push(move)
+        return replay
+
+    # SAN parsed against the board, which the caller moves on after each move
+    def _moves(self, board: Board) -> Iterator[Move]:
+        for ply, san in enumerate(self.moves):
+            move = board.legal_moves_san(board.side_to_move).get(_normalize(san))
+            if move is None:
+                raise ValueError(f"Illegal move {ply // 2 + 1}. {san} in {board.fen}")
+            yield move
+
+
+def _normalize(san: str) -> str:
+    # check marks and annotations are not part of this library's SAN
+    san = san.rstrip("+#!?")
+    return san.replace("0", "O") if san.startswith("0-0") else san
+
+
+def _game(headers: Dict[str, str], movetext: List[str]) -> PgnGame:
+    moves: List[str] = []
+    views: List[Optional[Tuple[str, str]]] = []
+    result = RESULT_COLORS.get(headers.get("Result", "*"))
+    depth = 0  # of variations
+    for token in _TOKEN.findall(" ".join(movetext)):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth or token[0] in ";$" or token[0].isdigit() and token[-1] == ".":
+            continue
+        elif token[0] == "{":
+            found = dict(_VIEW.findall(token))
+            if moves and "w" in found and "b" in found:
+                views[-1] = (found["w"], found["b"])
+        elif token in RESULT_COLORS:
+            result = RESULT_COLORS[token]
+        else:
+            moves.append(token)
+            views.append(None)
+    return PgnGame(headers, moves, views, result)
+
+
+def read_games(lines: Iterable[str]) -> Iterator[PgnGame]:
+    """Games from an open PGN file or any iterable of lines, one at a time."""
+    headers: Dict[str, str] = {}
+    movetext: List[str] = []
+    in_comment = False  # a {} comment runs on over the line end
+    for line in lines:
+        line = line.strip()
+        if line.startswith("[") and not in_comment:
+            if movetext:  # tags of the next game
+                yield _game(headers, movetext)
+                headers, movetext = {}, []
+            match = _TAG.match(line)
+            if match:
+                headers[match.group(1)] = re.sub(r"\\(.)", r"\1", match.group(2))
+        elif line and (in_comment or not line.startswith("%")):
+            movetext.append(line)
+            last = max(line.rfind("{"), line.rfind("}"))
+            if last >= 0:  # comments do not nest: the last brace decides
+                in_comment = line[last] == "{"
+    if headers or movetext:
+        yield _game(headers, movetext)
+
+
+def format_game(
+    moves: List[str],
+    headers: Optional[Dict[str, str]] = None,
+    result: Optional[ChessColor] = None,
+    views: Optional[List[Tuple[str, str]]] = None,
+    fen: Optional[str] = None,
+    line_length: int = 80,
+) -> str:
+    headers = dict(headers or {})
+    if fen and fen != START_FEN:
+        headers.update(SetUp="1", FEN=fen)
+    headers["Result"] = RESULTS[result]
+    lines = [
+        '[{} "{}"]'.format(tag, value.replace("\\", "\\\\").replace('"', '\\"'))
+        for tag, value in headers.items()
+    ]
+    lines.append("")
+
+    ply = 0
+    if fen and fen.split(" ")[1] == "b":
+        ply = 1  # black moves first
+    number = int(fen.split(" ")[5]) if fen else 1
+    tokens = []
+    for i, san in enumerate(moves):
+        if ply % 2 == 0:
+            tokens.append(f"{number}.")
+        elif i == 0:
+            tokens.append(f"{number}...")
+        tokens.append(san)
+        if views:
+            white, black = views[i]
+            tokens.append(f"{{[%fow_w {white}] [%fow_b {black}]}}")
+        ply += 1
+        if ply % 2 == 0:
+            number += 1
+    tokens.append(RESULTS[result])
+
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > line_length:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+
+def format_replay(
+    replay: Replay, headers: Optional[Dict[str, str]] = None, views: bool = True
+) -> str:
+    """The game of a Replay, with both players' views after every move."""
+    board = Board(replay.initial_fen, backend=replay.backend)
+    sans = []
+    fow_views = []
+    for packed in replay.moves:
+        move = board.move_from_packed(packed)
+        sans.append(board.san_of(move))
+        board.apply_move(move)
+        if views:
+            fow_views.append(
+                (
+                    board.to_fow_fen(ChessColor.WHITE),
+                    board.to_fow_fen(ChessColor.BLACK),
+                )
+            )
+    return format_game(
+        sans, headers, replay.result, fow_views if views else None, replay.initial_fen
+    )
+
+
+class PgnWriter:
+    """Appends games to a PGN file."""
+
+    def __init__(self, file: TextIO, views: bool = True):
+        self.file = file
+        self.views = views
+        self.games = 0
+
+    def write(self, game: PgnGame):
+        views = game.views if self.views and all(game.views) else None
+        self.file.write(
+            format_game(game.moves, game.headers, game.result, views, game.fen)
+        )
+        self.games += 1
+
+    def write_replay(self, replay: Replay, headers: Optional[Dict[str, str]] = None):
+        self.file.write(format_replay(replay, headers, self.views))
+        self.games += 1
+
+
+def _line_before(f, offset: int) -> bytes:
+    # the line (without its newline) that ends just before offset, the start
+    # of the next line
+    line = b""
+    position = offset - 1  # the newline that ends it
+    while position > 0:
+        step = min(position, 4096)
+        position -= step
+        f.seek(position)
+        block = f.read(step)
+        newline = block.rfind(b"\n")
+        if newline >= 0:
+            return block[newline + 1 :] + line
+        line = block + line
+    return line
+
+
+def _range_lines(f, start: int, end: int) -> Iterator[str]:
+    # Lines of the games whose first tag line starts in [start, end). A game
+    # starts at a tag line that follows a blank line or the start of the file.
+    # The range at 0 also owns what comes before the first tag line, such as
+    # a first game without tags.
+    if start:
+        f.seek(start - 1)
+        previous = f.readline()  # rest of the line holding start - 1
+        if not previous.strip():  # a blank rest says nothing: read all of it
+            following = start - 1 + len(previous)
+            previous = _line_before(f, following)
+            f.seek(following)
+    else:
+        previous = b"\n"
+    owned = not start
+    while True:
+        offset = f.tell()
+        line = f.readline()
+        if not line:
+            return
+        if line.startswith(b"[") and not previous.strip():
+            if offset >= end:
+                return
+            owned = True
+        if owned:
+            yield line.decode("utf-8", errors="replace")
+        previous = line
+
+
+def _map_range(
+    path: str, start: int, end: int, function: Callable[[PgnGame], object]
+) -> list:
+    with open(path, "rb") as f:
+        return [function(game) for game in read_games(_range_lines(f, start, end))]
+
+
+def map_archive(
+    path: str,
+    function: Callable[[PgnGame], object],
+    workers: Optional[int] = None,
+    chunk_bytes: int = 16 << 20,
+) -> Iterator[object]:
+    """function(game) for every game of the file at path, in file order.
+
+    The file is cut into chunks of about chunk_bytes, parsed by a pool of
+    worker processes; function must be picklable (a module-level function).
+    At most two chunks per worker are in flight, so memory does not grow
+    with the file when the caller consumes results slower than they come.
+    """
+    size = os.path.getsize(path)
+    bounds = list(range(0, size, chunk_bytes)) + [size]
+    window = 2 * (workers or os.cpu_count() or 1)
+    pending: Deque[Future] = deque()
+    with ProcessPoolExecutor(workers) as pool:
+        try:
+            for start, end in zip(bounds, bounds[1:]):
+                pending.append(pool.submit(_map_range, path, start, end, function))
+                if len(pending) >= window:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:  # the caller stopped early
+            for future in pending:
+                future.cancel()
+
+
+def game_stats(game: PgnGame) -> Tuple[int, int]:
+    # (1, plies): checks that every move is legal
+    plies = 0
+    for _ in game.positions():
+        plies += 1
+    return 1, plies
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m fow_chess.pgn",
+        description="Check the games of a PGN archive and count them.",
+    )
+    parser.add_argument("path")
+    parser.add_argument("-w", "--workers", type=int, help="parse in a process pool")
+    args = parser.parse_args(argv)
+
+    if args.workers:
+        results = map_archive(args.path, game_stats, args.workers)
+    else:
+        with open(args.path) as f:
+            results = [game_stats(game) for game in read_games(f)]
+    games = plies = 0
+    for game_count, game_plies in results:
+        games += game_count
+        plies += game_plies
+    print(f"games {games}  plies {plies}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,13 @@ from enum import Enum
 
 from fow_chess.chesscolor import ChessColor
 from fow_chess.position import Position
+from fow_chess.tables import (
+    BETWEEN_SQUARES,
+    BISHOP_LINES,
+    KING_ATTACKS,
+    KNIGHT_ATTACKS,
+    ROOK_LINES,
+)
 
 
 class PieceType(Enum):
@@ -14,23 +21,30 @@ class PieceType(Enum):
 
     @property
     def ordinal(self):
-        return {
-            PieceType.PAWN: 0,
-            PieceType.KNIGHT: 1,
-            PieceType.BISHOP: 2,
-            PieceType.ROOK: 3,
-            PieceType.QUEEN: 4,
-            PieceType.KING: 5,
-        }[self]
+        return PIECE_ORDINALS[self]
+
+
+PIECE_ORDINALS = {
+    PieceType.PAWN: 0,
+    PieceType.KNIGHT: 1,
+    PieceType.BISHOP: 2,
+    PieceType.ROOK: 3,
+    PieceType.QUEEN: 4,
+    PieceType.KING: 5,
+}
+# FEN letter (lower case) -> type, cheaper than calling PieceType(letter)
+PIECE_LETTERS = {piece_type.value: piece_type for piece_type in PieceType}
 
 
 class Piece:
+    __slots__ = ("color", "type", "position")
+
     def __init__(self, piece, position: Position):
         if piece.islower():
             self.color = ChessColor.BLACK
         else:
             self.color = ChessColor.WHITE
-        self.type = PieceType(piece.lower())
+        self.type = PIECE_LETTERS[piece.lower()]
         self.position = position
 
     def __str__(self):
@@ -48,8 +62,9 @@ class Piece:
             and self.position == other.position
         )
 
+    # equal pieces stand on the same square, and the index is cheap to hash
     def __hash__(self):
-        return hash((self.color, self.type, self.position))
+        return self.position.index
 
     @property
     def rank(self):
@@ -64,23 +79,10 @@ class Piece:
 
         def is_path_clear(start: Position, end: Position) -> bool:
             """Check if the path between start and end is clear of pieces."""
-            delta_file = end.file - start.file
-            delta_rank = end.rank - start.rank
-            file_step = 0 if delta_file == 0 else (1 if delta_file > 0 else -1)
-            rank_step = 0 if delta_rank == 0 else (1 if delta_rank > 0 else -1)
-
-            current = Position(file=start.file + file_step, rank=start.rank + rank_step)
-            while current != end:
-                from fow_chess import board
-
-                if board.pieces.get(
-                    Position(current.file, current.rank)
-                ):  # Assuming 1-based indexing
-                    return False
-                current = Position(
-                    file=current.file + file_step, rank=current.rank + rank_step
-                )
-            return True
+            return not any(
+                board.pieces.get(position)
+                for position in BETWEEN_SQUARES[start.square][end.square]
+            )
 
         # This method is not used when this is a PAWN
         if self.type == PieceType.PAWN:
@@ -99,39 +101,29 @@ class Piece:
                     if to.rank == self.position.rank - 1:
                         return Move(current_fen, self, to)
         elif self.type == PieceType.KNIGHT:
-            if (
-                abs(self.position.rank - to.rank) == 2
-                and abs(self.position.file - to.file) == 1
-            ) or (
-                abs(self.position.rank - to.rank) == 1
-                and abs(self.position.file - to.file) == 2
-            ):
+            if KNIGHT_ATTACKS[self.position.square] >> to.square & 1:
                 return Move(current_fen, self, to)
         elif self.type == PieceType.BISHOP:
-            if abs(self.position.rank - to.rank) == abs(
-                self.position.file - to.file
-            ) and is_path_clear(self.position, to):
+            if BISHOP_LINES[self.position.square] >> to.square & 1 and is_path_clear(
+                self.position, to
+            ):
                 # check if there is a piece in the way
                 return Move(current_fen, self, to)
         elif self.type == PieceType.ROOK:
-            if (
-                self.position.rank == to.rank or self.position.file == to.file
-            ) and is_path_clear(self.position, to):
+            if ROOK_LINES[self.position.square] >> to.square & 1 and is_path_clear(
+                self.position, to
+            ):
                 # check if there is a piece in the way
                 return Move(current_fen, self, to)
         elif self.type == PieceType.QUEEN:
-            if (
-                abs(self.position.rank - to.rank) == abs(self.position.file - to.file)
-                or self.position.rank == to.rank
-                or self.position.file == to.file
-            ) and is_path_clear(self.position, to):
+            lines = (
+                BISHOP_LINES[self.position.square] | ROOK_LINES[self.position.square]
+            )
+            if lines >> to.square & 1 and is_path_clear(self.position, to):
                 # check if there is a piece in the way
                 return Move(current_fen, self, to)
         elif self.type == PieceType.KING:
             # Should not be needed, but just in case
-            if (
-                abs(self.position.rank - to.rank) <= 1
-                and abs(self.position.file - to.file) <= 1
-            ):
+            if KING_ATTACKS[self.position.square] >> to.square & 1:
                 return Move(current_fen, self, to)
         return None
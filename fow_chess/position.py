@@ -1,7 +1,17 @@
+# Bits outside 0x77 are set exactly for 0x88 indices that fall off the board.
+OFF_BOARD = ~0x77
+
+
 class Position:
+    __slots__ = ("file", "rank", "square", "index")
+
     def __init__(self, file, rank):
         self.file = file
         self.rank = rank
+        # index of the square, a1 = 0 ... h8 = 63
+        self.square = (rank - 1) * 8 + file - 1
+        # 0x88 index, rank * 16 + file (0-based); see OFF_BOARD
+        self.index = (rank - 1) * 16 + file - 1
 
     def to_san(self) -> str:
         return chr(ord("a") + self.file - 1) + chr(ord("1") + self.rank - 1)
@@ -15,15 +25,31 @@ class Position:
     @staticmethod
     def from_san(san: str):
         san = san.lower()
-        return Position(
+        position = Position(
             file=ord(san[0]) - ord("a") + 1, rank=ord(san[1]) - ord("1") + 1
         )
+        return BY_INDEX[position.index] if position.is_valid() else position
+
+    @staticmethod
+    def from_square(square: int):
+        return SQUARES[square]
 
     def is_valid(self) -> bool:
-        return self.file in range(1, 9) and self.rank in range(1, 9)
+        return not self.index & OFF_BOARD
 
     def __eq__(self, other):
+        if self is other:
+            return True
+        if other is None:
+            return False
         return self.file == other.file and self.rank == other.rank
 
     def __hash__(self):
-        return hash((self.file, self.rank))
+        return self.index
+
+
+# The 64 shared positions, by square and by 0x88 index (None off the board)
+SQUARES = [Position(file=square % 8 + 1, rank=square // 8 + 1) for square in range(64)]
+BY_INDEX = [None] * 128
+for _position in SQUARES:
+    BY_INDEX[_position.index] = _position
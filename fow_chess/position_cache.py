@@ -0,0 +1,90 @@
+# Results that depend only on the position, shared between boards: packed legal
+# moves, fog-of-war FENs and fog-of-war arrays, keyed by the Zobrist hash of
+# the position (plus what else the result depends on). Move objects are not
+# cached, as they refer to the pieces of one board.
+#
+#   cache = use_position_cache(PositionCache(max_entries=100_000, max_bytes=64 << 20))
+#   ...
+#   print(cache.stats())
+import sys
+from collections import OrderedDict
+from typing import Hashable, NamedTuple, Optional
+
+# rough cost of an entry besides its value: the key tuple and the dict slot
+ENTRY_OVERHEAD = 200
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / max(self.hits + self.misses, 1)
+
+
+class PositionCache:
+    """LRU cache bounded by a number of entries and, optionally, by bytes.
+
+    Values are stored as given and must not be changed afterwards; Board
+    hands out copies.
+    """
+
+    def __init__(self, max_entries: int = 100_000, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # value, size
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: Hashable, value):
+        size = sys.getsizeof(value) + ENTRY_OVERHEAD
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old[1]
+        self._entries[key] = (value, size)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or (
+            self.max_bytes is not None and self.bytes > self.max_bytes
+        ):
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            self.hits, self.misses, self.evictions, len(self._entries), self.bytes
+        )
+
+
+# Shares the cache between all boards of the process; None turns caching off.
+# A single board can have its own with board.position_cache = cache.
+def use_position_cache(cache: Optional[PositionCache]) -> Optional[PositionCache]:
+    from fow_chess.board import Board
+
+    Board.position_cache = cache
+    return cache
@@ -0,0 +1,205 @@
+# Opt-in instrumentation of the hot Board operations. enable() replaces the
+# methods listed in INSTRUMENTED with timed wrappers and disable() puts the
+# originals back, so nothing is measured, and nothing is paid, while disabled.
+# Times are wall times including nested instrumented calls, and are kept per
+# process: pool workers have their own counters.
+#
+#   python -m fow_chess.profiling -n 20 [--backend bitboard] [--prometheus FILE]
+import argparse
+import bisect
+import functools
+import importlib
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# (module, class or None for a module function, attribute, operation name)
+INSTRUMENTED: List[Tuple[str, Optional[str], str, str]] = [
+    ("fow_chess.board", "Board", "get_legal_moves", "get_legal_moves"),
+    ("fow_chess.board", "Board", "to_fen", "to_fen"),
+    ("fow_chess.board", "Board", "to_fow_fen", "to_fow_fen"),
+    ("fow_chess.board", "Board", "to_array", "to_array"),
+    ("fow_chess.board", "Board", "to_fow_array", "to_fow_array"),
+    ("fow_chess.board", "Board", "apply_move", "apply_move"),
+    ("fow_chess.board", "Board", "visible_squares", "visible_squares"),
+    ("fow_chess.board", "Board", "sight_mask", "sight_mask"),
+    ("fow_chess.bitboard", "BitboardBoard", "get_legal_moves", "get_legal_moves"),
+    ("fow_chess.bitboard", "BitboardBoard", "to_fen", "to_fen"),
+    ("fow_chess.bitboard", "BitboardBoard", "to_array", "to_array"),
+    # BitboardBoard.apply_move and apply_packed both end up here
+    ("fow_chess.bitboard", "BitboardBoard", "apply_raw_move", "apply_move"),
+    ("fow_chess.bitboard", "BitboardBoard", "visible_squares", "visible_squares"),
+    ("fow_chess.bitboard", "BitboardBoard", "sight_mask", "sight_mask"),
+    ("fow_chess.move", "Move", "to_san", "move_to_san"),
+    ("fow_chess.fen_parser", "FenParser", "parse", "parse_fen"),
+    ("fow_chess.fen_parser", None, "fens_to_arrays", "fens_to_arrays"),
+    # its body, which callers that imported encode_fow_batch by name still reach
+    ("fow_chess.encoding", None, "_encode_fow_batch", "encode_fow_batch"),
+]
+
+# upper bounds of the latency histogram buckets: 1us, 2us, 4us, ... ~1s
+BUCKETS = tuple(1e-6 * 2**i for i in range(21))
+
+
+class OpStats:
+    __slots__ = ("count", "seconds", "max_seconds", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)  # the last one is +Inf
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def as_dict(self) -> dict:
+        cumulative = 0
+        histogram = []
+        for bound, count in zip(BUCKETS + (float("inf"),), self.buckets):
+            cumulative += count
+            histogram.append((bound, cumulative))
+        return {
+            "count": self.count,
+            "seconds": self.seconds,
+            "mean_us": 1e6 * self.seconds / max(self.count, 1),
+            "max_us": 1e6 * self.max_seconds,
+            "buckets": histogram,  # (upper bound in seconds, cumulative count)
+        }
+
+
+_stats: Dict[str, OpStats] = {}
+_originals: List[Tuple[object, str, Callable]] = []
+
+
+def _timed(function: Callable, stats: OpStats) -> Callable:
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stats.record(time.perf_counter() - start)
+
+    return timed
+
+
+def enabled() -> bool:
+    return bool(_originals)
+
+
+def enable():
+    if enabled():
+        return
+    for module_name, class_name, attribute, name in INSTRUMENTED:
+        module = importlib.import_module(module_name)
+        owner = module if class_name is None else getattr(module, class_name)
+        # only where the function is defined: inherited methods are already timed
+        original = vars(owner)[attribute]
+        stats = _stats.setdefault(name, OpStats())
+        _originals.append((owner, attribute, original))
+        setattr(owner, attribute, _timed(original, stats))
+
+
+def disable():
+    while _originals:
+        owner, attribute, original = _originals.pop()
+        setattr(owner, attribute, original)
+
+
+def reset():
+    _stats.clear()
+    if enabled():  # the wrappers hold on to their OpStats
+        disable()
+        enable()
+
+
+@contextmanager
+def profiled() -> Iterator[Dict[str, OpStats]]:
+    """Instruments the operations for the duration of a with block."""
+    was_enabled = enabled()
+    enable()
+    try:
+        yield _stats
+    finally:
+        if not was_enabled:
+            disable()
+
+
+def snapshot() -> Dict[str, dict]:
+    return {name: stats.as_dict() for name, stats in sorted(_stats.items())}
+
+
+def to_json(**kwargs) -> str:
+    return json.dumps(snapshot(), **kwargs)
+
+
+def to_prometheus(prefix: str = "fow_chess_op") -> str:
+    lines = [
+        f"# HELP {prefix}_seconds Wall time of instrumented fow_chess operations.",
+        f"# TYPE {prefix}_seconds histogram",
+    ]
+    for name, stats in snapshot().items():
+        for bound, count in stats["buckets"]:
+            le = "+Inf" if bound == float("inf") else f"{bound:.9g}"
+            lines.append(f'{prefix}_seconds_bucket{{op="{name}",le="{le}"}} {count}')
+        lines.append(f'{prefix}_seconds_sum{{op="{name}"}} {stats["seconds"]:.9g}')
+        lines.append(f'{prefix}_seconds_count{{op="{name}"}} {stats["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+# Writes the Prometheus text format to path, atomically so that a collector
+# (e.g. the node exporter textfile collector) never reads a partial file
+def write_prometheus(path: str, prefix: str = "fow_chess_op"):
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        f.write(to_prometheus(prefix))
+    os.replace(temporary, path)
+
+
+def format_table() -> str:
+    rows = [f"{'operation':16s} {'calls':>9s} {'total s':>9s} {'mean us':>9s}"]
+    for name, stats in sorted(snapshot().items(), key=lambda item: -item[1]["seconds"]):
+        rows.append(
+            f"{name:16s} {stats['count']:9d} {stats['seconds']:9.3f}"
+            f" {stats['mean_us']:9.1f}"
+        )
+    return "\n".join(rows)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from fow_chess.board import BACKENDS
+    from fow_chess.selfplay import play_game
+
+    parser = argparse.ArgumentParser(
+        prog="python -m fow_chess.profiling",
+        description="Profile the Board operations over random self-play games.",
+    )
+    parser.add_argument("-n", "--games", type=int, default=10)
+    parser.add_argument("--backend", choices=BACKENDS, default="default")
+    parser.add_argument("--max-plies", type=int, default=256)
+    parser.add_argument("--json", help="write the snapshot as JSON to this file")
+    parser.add_argument("--prometheus", help="write the Prometheus text format here")
+    args = parser.parse_args(argv)
+
+    with profiled():
+        for _ in range(args.games):
+            play_game(backend=args.backend, max_plies=args.max_plies)
+    print(format_table())
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(to_json(indent=2))
+    if args.prometheus:
+        write_prometheus(args.prometheus)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+# Compact game record: the initial FEN, one 16-bit packed move per ply and a FEN
+# checkpoint every few plies, so any position can be rebuilt by replaying at
+# most checkpoint_every - 1 moves.
+from array import array
+from typing import Iterable, List, Optional
+
+from fow_chess.board import Board
+from fow_chess.chesscolor import ChessColor
+from fow_chess.move import Move
+from fow_chess.packed_move import pack_move
+
+
+class Replay:
+    def __init__(
+        self,
+        fen: Optional[str] = None,
+        backend: str = "default",
+        checkpoint_every: int = 16,
+    ):
+        self.backend = backend
+        self.checkpoint_every = checkpoint_every
+        # the position after the last move
+        self.board = Board(fen, backend=backend)
+        self.moves = array("H")
+        # checkpoints[i]: FEN after i * checkpoint_every plies
+        self.checkpoints: List[str] = [self.board.fen]
+        self.result: Optional[ChessColor] = None
+
+    @classmethod
+    def from_packed(
+        cls,
+        packed_moves: Iterable[int],
+        fen: Optional[str] = None,
+        backend: str = "default",
+        checkpoint_every: int = 16,
+    ) -> "Replay":
+        replay = cls(fen, backend, checkpoint_every)
+        for packed in packed_moves:
+            replay.push_packed(int(packed))
+        return replay
+
+    def __len__(self) -> int:
+        return len(self.moves)
+
+    @property
+    def initial_fen(self) -> str:
+        return self.checkpoints[0]
+
+    # Plays a move of the current position (a move of self.board)
+    # returns: same as apply_move
+    def push(self, move: Move) -> Optional[ChessColor]:
+        packed = pack_move(move)
+        self.result = self.board.apply_move(move)
+        return self._recorded(packed)
+
+    # returns: same as apply_move
+    def push_packed(self, packed: int) -> Optional[ChessColor]:
+        self.result = self.board.apply_packed(packed)
+        return self._recorded(packed)
+
+    def _recorded(self, packed: int) -> Optional[ChessColor]:
+        self.moves.append(packed)
+        if len(self.moves) % self.checkpoint_every == 0:
+            self.checkpoints.append(self.board.fen)
+        return self.result
+
+    # The position after `ply` moves (0: the initial position) on a new board.
+    # Its hash history starts at the nearest checkpoint.
+    def position_at(self, ply: int) -> Board:
+        if ply < 0:
+            ply += len(self.moves) + 1
+        if not 0 <= ply <= len(self.moves):
+            raise IndexError(f"ply {ply} out of range 0..{len(self.moves)}")
+        checkpoint = ply // self.checkpoint_every
+        board = Board(self.checkpoints[checkpoint], backend=self.backend)
+        for packed in self.moves[checkpoint * self.checkpoint_every : ply]:
+            board.apply_packed(packed)
+        return board
+
+    def fow_view_at(self, ply: int, color: ChessColor) -> str:
+        return self.position_at(ply).to_fow_fen(color)
@@ -0,0 +1,259 @@
+# Self-play data generator: worker processes play games with a policy and send
+# finished games through a bounded queue to the parent, which writes them to
+# .npz shards. Workers block on a full queue, so the writer sets the pace.
+#
+#   python -m fow_chess.selfplay -n 10000 -w 8 -o shards/ [--policy module:function]
+import argparse
+import importlib
+import multiprocessing
+import os
+import random
+import sys
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+import numpy as np
+
+from fow_chess.board import BACKENDS, Board
+from fow_chess.chesscolor import ChessColor
+from fow_chess.dataset import DatasetWriter
+from fow_chess.encoding import encode_fow_batch
+from fow_chess.move import Move
+from fow_chess.packed_move import pack_move
+
+# Picks one of the legal moves of the side to move; must be picklable (a
+# module-level function) to be sent to the worker processes.
+Policy = Callable[[Board, List[Move]], Move]
+
+UNFINISHED = -1  # result of a game cut off at max_plies
+
+
+def random_policy(board: Board, moves: List[Move]) -> Move:
+    return random.choice(moves)
+
+
+class GameRecord(NamedTuple):
+    observations: np.ndarray  # (plies, 2, 8, 8, 20): to_fow_array(WHITE), (BLACK)
+    moves: np.ndarray  # (plies,) packed moves, see fow_chess.packed_move
+    result: int  # ChessColor value of the winner, DRAW, or UNFINISHED
+
+
+def play_game(
+    policy: Policy = random_policy,
+    fen: Optional[str] = None,
+    backend: str = "default",
+    max_plies: int = 512,
+) -> GameRecord:
+    board = Board(fen, backend=backend)
+    colors = [ChessColor.WHITE, ChessColor.BLACK]
+    observations = np.empty((max_plies, 2, 8, 8, 20), dtype=bool)
+    moves = np.empty(max_plies, dtype=np.uint16)
+    result = UNFINISHED
+    plies = 0
+    while plies < max_plies:
+        legal_moves = [
+            move
+            for piece_moves in board.get_legal_moves(board.side_to_move).values()
+            for move in piece_moves
+        ]
+        if not legal_moves:
+            result = ChessColor.DRAW.value
+            break
+        encode_fow_batch([board, board], colors, out=observations[plies])
+        move = policy(board, legal_moves)
+        moves[plies] = pack_move(move)
+        plies += 1
+        winner = board.apply_move(move)
+        if winner is not None:
+            result = winner.value
+            break
+    return GameRecord(observations[:plies].copy(), moves[:plies].copy(), result)
+
+
+class ShardWriter:
+    """Collects games and writes them to shard-NNNNN.npz files in a directory.
+
+    A shard is written once it holds at least plies_per_shard plies; games are
+    never split. Each shard has per-ply arrays observations (P, 2, 8, 8, 20),
+    moves (P,) and results (P,) (the result of the game the ply belongs to), and
+    game_lengths (G,) to find the games again.
+    """
+
+    def __init__(self, directory: str, plies_per_shard: int = 1 << 16):
+        self.directory = directory
+        self.plies_per_shard = plies_per_shard
+        self.games: List[GameRecord] = []
+        self.plies = 0
+        self.shards = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def add(self, game: GameRecord):
+        self.games.append(game)
+        self.plies += len(game.moves)
+        if self.plies >= self.plies_per_shard:
+            self.flush()
+
+    def flush(self):
+        if not self.games:
+            return
+        lengths = np.array([len(game.moves) for game in self.games], dtype=np.int32)
+        path = os.path.join(self.directory, f"shard-{self.shards:05d}.npz")
+        np.savez_compressed(
+            path,
+            observations=np.concatenate([game.observations for game in self.games]),
+            moves=np.concatenate([game.moves for game in self.games]),
+            results=np.repeat(
+                np.array([game.result for game in self.games], dtype=np.int8), lengths
+            ),
+            game_lengths=lengths,
+        )
+        self.shards += 1
+        self.games = []
+        self.plies = 0
+
+    def close(self):
+        self.flush()
+
+
+def _worker(
+    games: int,
+    queue: multiprocessing.Queue,
+    policy: Policy,
+    fen: Optional[str],
+    backend: str,
+    max_plies: int,
+    seed: int,
+):
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    try:
+        for _ in range(games):
+            queue.put(play_game(policy, fen, backend, max_plies))
+    finally:
+        queue.put(None)
+
+
+class SelfPlayStats(NamedTuple):
+    games: int
+    plies: int
+    shards: int
+    seconds: float
+
+
+def run(
+    num_games: int,
+    directory: str,
+    workers: int = os.cpu_count() or 1,
+    policy: Policy = random_policy,
+    fen: Optional[str] = None,
+    backend: str = "default",
+    max_plies: int = 512,
+    plies_per_shard: int = 1 << 16,
+    queue_size: int = 64,
+    seed: int = 0,
+    report_every: float = 10.0,
+    packed: bool = False,
+) -> SelfPlayStats:
+    """Plays num_games games in worker processes and writes them to shards.
+
+    queue_size bounds the finished games waiting for the writer. Progress
+    (games/sec, plies/sec) is printed every report_every seconds. With packed,
+    games are written as a fow_chess.dataset directory instead of npz shards.
+    """
+    queue = multiprocessing.Queue(queue_size)
+    shares = [num_games // workers + (i < num_games % workers) for i in range(workers)]
+    processes = [
+        multiprocessing.Process(
+            target=_worker,
+            args=(games, queue, policy, fen, backend, max_plies, seed + i),
+            daemon=True,
+        )
+        for i, games in enumerate(shares)
+        if games
+    ]
+    for process in processes:
+        process.start()
+
+    if packed:
+        writer = DatasetWriter(directory, 2 * plies_per_shard)
+    else:
+        writer = ShardWriter(directory, plies_per_shard)
+    games = plies = 0
+    running = len(processes)
+    start = last_report = time.perf_counter()
+    while running:
+        game = queue.get()
+        if game is None:
+            running -= 1
+            continue
+        writer.add(game)
+        games += 1
+        plies += len(game.moves)
+        now = time.perf_counter()
+        if now - last_report >= report_every:
+            last_report = now
+            elapsed = now - start
+            print(
+                f"{games}/{num_games} games  {games / elapsed:.1f} games/s  "
+                f"{plies / elapsed:.0f} plies/s",
+                file=sys.stderr,
+            )
+    writer.close()
+    for process in processes:
+        process.join()
+    return SelfPlayStats(games, plies, writer.shards, time.perf_counter() - start)
+
+
+def load_policy(name: str) -> Policy:
+    module, _, function = name.partition(":")
+    return getattr(importlib.import_module(module), function)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m fow_chess.selfplay",
+        description="Play games in worker processes and write training shards.",
+    )
+    parser.add_argument("-n", "--games", type=int, default=1000)
+    parser.add_argument("-o", "--output", default="shards")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--policy",
+        default="fow_chess.selfplay:random_policy",
+        help="module:function taking (board, legal moves) and returning a move",
+    )
+    parser.add_argument("--fen")
+    parser.add_argument("--backend", choices=BACKENDS, default="default")
+    parser.add_argument("--max-plies", type=int, default=512)
+    parser.add_argument("--plies-per-shard", type=int, default=1 << 16)
+    parser.add_argument("--queue-size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report-every", type=float, default=10.0)
+    parser.add_argument(
+        "--packed", action="store_true", help="write a bit-packed fow_chess.dataset"
+    )
+    args = parser.parse_args(argv)
+
+    stats = run(
+        args.games,
+        args.output,
+        workers=args.workers,
+        policy=load_policy(args.policy),
+        fen=args.fen,
+        backend=args.backend,
+        max_plies=args.max_plies,
+        plies_per_shard=args.plies_per_shard,
+        queue_size=args.queue_size,
+        seed=args.seed,
+        report_every=args.report_every,
+        packed=args.packed,
+    )
+    print(
+        f"{stats.games} games, {stats.plies} plies, {stats.shards} shards in "
+        f"{stats.seconds:.1f}s ({stats.games / max(stats.seconds, 1e-9):.1f} games/s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
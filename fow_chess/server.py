@@ -0,0 +1,291 @@
+# Asyncio game host: many games in one process, played over TCP with one JSON
+# object per line. Each player only ever receives their own fog-of-war view.
+# Views and move lists are computed in a process pool from the FEN, so a slow
+# position does not hold up the event loop.
+#
+#   python -m fow_chess.server --port 8765 --workers 4
+#
+# Requests ("game" is the id returned by "new"):
+#   {"op": "new"}                              -> play white in a new game
+#   {"op": "new", "fen": "<fen>"}              -> ... from that position
+#   {"op": "join", "game": 1}                  -> play black
+#   {"op": "move", "game": 1, "move": "e4"}    -> SAN from the "moves" list
+#   {"op": "state", "game": 1}
+#   {"op": "stats"}
+# Replies and pushes:
+#   {"event": "joined", "game": 1, "color": "white"}
+#   {"event": "state", "game": 1, "color": "white", "fen": <fow fen>,
+#    "turn": "black", "moves": [...], "result": null}
+#   {"event": "stats", ...}, {"event": "error", "message": "..."}
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from fow_chess.board import BACKENDS, Board
+from fow_chess.chesscolor import ChessColor
+from fow_chess.fen_parser import PIECE_CHARS, expand_placement
+from fow_chess.packed_move import pack_move
+
+
+# Workers are spawned rather than forked: a forked worker would inherit the
+# open client sockets and keep them from closing.
+def fog_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+_RANK_CHARS = set(PIECE_CHARS + "12345678")
+
+
+# Board() trusts its FEN; one from a client is checked first.
+def check_fen(fen: str):
+    fields = fen.split(" ")
+    if len(fields) != 6:
+        raise ValueError(f"Invalid FEN, expected 6 fields: {fen}")
+    placement, side_to_move, castling, en_passant, halfmove, fullmove = fields
+    ranks = placement.split("/")
+    if len(ranks) != 8 or any(
+        set(rank) - _RANK_CHARS or len(expand_placement(rank)) != 8 for rank in ranks
+    ):
+        raise ValueError(f"Invalid FEN placement: {placement}")
+    if placement.count("K") != 1 or placement.count("k") != 1:
+        raise ValueError(f"Invalid FEN, each side needs one king: {placement}")
+    if set(ranks[0] + ranks[7]) & set("Pp"):
+        raise ValueError(f"Invalid FEN, pawn on the first or last rank: {placement}")
+    if side_to_move not in ("w", "b"):
+        raise ValueError(f"Invalid FEN side to move: {side_to_move}")
+    if castling != "-" and (not castling or set(castling) - set("KQkq")):
+        raise ValueError(f"Invalid FEN castling rights: {castling}")
+    if en_passant != "-" and (
+        len(en_passant) != 2
+        or en_passant[0] not in "abcdefgh"
+        or en_passant[1] != ("6" if side_to_move == "w" else "3")
+    ):
+        raise ValueError(f"Invalid FEN en passant square: {en_passant}")
+    if not (halfmove.isdigit() and fullmove.isdigit()):
+        raise ValueError(f"Invalid FEN move counters: {halfmove} {fullmove}")
+
+
+# returns: (white view, black view, SAN -> packed move for the side to move)
+def compute_views(fen: str, backend: str) -> Tuple[str, str, Dict[str, int]]:
+    board = Board(fen, backend=backend)
+    moves = board.legal_moves_san(board.side_to_move)
+    return (
+        board.to_fow_fen(ChessColor.WHITE),
+        board.to_fow_fen(ChessColor.BLACK),
+        {san: pack_move(move) for san, move in moves.items()},
+    )
+
+
+class Game:
+    def __init__(self, game_id: int, fen: Optional[str], backend: str):
+        self.id = game_id
+        self.board = Board(fen, backend=backend)
+        self.players: Dict[ChessColor, asyncio.StreamWriter] = {}
+        self.result: Optional[ChessColor] = None
+        self.views: Tuple[str, str] = ("", "")
+        self.moves: Dict[str, int] = {}
+        # serializes moves, so that views always match the board
+        self.lock = asyncio.Lock()
+
+
+class GameServer:
+    def __init__(
+        self,
+        executor: Optional[Executor] = None,
+        backend: str = "default",
+        fen: Optional[str] = None,
+    ):
+        self.executor = executor or fog_pool()
+        self.backend = backend
+        self.fen = fen
+        self.games: Dict[int, Game] = {}
+        self._ids = itertools.count(1)
+        self.moves_played = 0
+        self.move_seconds = 0.0
+        self.max_move_seconds = 0.0
+
+    async def _refresh(self, game: Game):
+        loop = asyncio.get_running_loop()
+        white, black, game.moves = await loop.run_in_executor(
+            self.executor, compute_views, game.board.fen, self.backend
+        )
+        game.views = (white, black)
+        if not game.moves and game.result is None:
+            game.result = ChessColor.DRAW  # no moves left
+
+    def _state(self, game: Game, color: ChessColor) -> dict:
+        your_turn = game.result is None and game.board.side_to_move == color
+        return {
+            "event": "state",
+            "game": game.id,
+            "color": str(color),
+            "fen": game.views[color.value],
+            "turn": str(game.board.side_to_move),
+            "moves": list(game.moves) if your_turn else [],
+            "result": None if game.result is None else str(game.result),
+        }
+
+    async def _broadcast(self, game: Game):
+        await asyncio.gather(
+            *[
+                self._send(writer, self._state(game, color))
+                for color, writer in game.players.items()
+            ]
+        )
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, message: dict):
+        if writer.is_closing():
+            return
+        writer.write(json.dumps(message).encode() + b"\n")
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    def _game(self, request: dict) -> Game:
+        game_id = request.get("game")
+        if not isinstance(game_id, int) or isinstance(game_id, bool):
+            raise ValueError(f"game must be a game id, got {game_id!r}")
+        game = self.games.get(game_id)
+        if game is None:
+            raise ValueError(f"Unknown game: {game_id}")
+        return game
+
+    @staticmethod
+    def _color_of(game: Game, writer: asyncio.StreamWriter) -> ChessColor:
+        for color, player in game.players.items():
+            if player is writer:
+                return color
+        raise ValueError(f"Not a player of game {game.id}")
+
+    async def _new(self, request: dict, writer: asyncio.StreamWriter):
+        fen = request.get("fen")
+        if fen is None:
+            fen = self.fen
+        elif isinstance(fen, str):
+            check_fen(fen)
+        else:
+            raise ValueError(f"fen must be a string, got {fen!r}")
+        game = Game(next(self._ids), fen, self.backend)
+        await self._refresh(game)
+        game.players[ChessColor.WHITE] = writer
+        self.games[game.id] = game
+        await self._send(writer, {"event": "joined", "game": game.id, "color": "white"})
+        await self._send(writer, self._state(game, ChessColor.WHITE))
+
+    async def _join(self, request: dict, writer: asyncio.StreamWriter):
+        game = self._game(request)
+        if ChessColor.BLACK in game.players:
+            raise ValueError(f"Game {game.id} is full")
+        if game.players.get(ChessColor.WHITE) is writer:
+            raise ValueError(f"Already playing white in game {game.id}")
+        game.players[ChessColor.BLACK] = writer
+        await self._send(writer, {"event": "joined", "game": game.id, "color": "black"})
+        await self._send(writer, self._state(game, ChessColor.BLACK))
+
+    async def _move(self, request: dict, writer: asyncio.StreamWriter):
+        start = time.perf_counter()
+        game = self._game(request)
+        async with game.lock:
+            color = self._color_of(game, writer)
+            if game.result is not None:
+                raise ValueError(f"Game {game.id} is over")
+            if game.board.side_to_move != color:
+                raise ValueError("Not your turn")
+            san = request.get("move")
+            if not isinstance(san, str):
+                raise ValueError(f"move must be a SAN string, got {san!r}")
+            packed = game.moves.get(san)
+            if packed is None:
+                raise ValueError(f"Illegal move: {san}")
+            game.result = game.board.apply_move(game.board.move_from_packed(packed))
+            await self._refresh(game)
+        await self._broadcast(game)
+        elapsed = time.perf_counter() - start
+        self.moves_played += 1
+        self.move_seconds += elapsed
+        self.max_move_seconds = max(self.max_move_seconds, elapsed)
+
+    def stats(self) -> dict:
+        return {
+            "event": "stats",
+            "games": len(self.games),
+            "active_games": sum(game.result is None for game in self.games.values()),
+            "moves": self.moves_played,
+            "mean_move_ms": 1000 * self.move_seconds / max(self.moves_played, 1),
+            "max_move_ms": 1000 * self.max_move_seconds,
+        }
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            async for line in reader:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("A request must be a JSON object")
+                    op = request.get("op")
+                    if op == "new":
+                        await self._new(request, writer)
+                    elif op == "join":
+                        await self._join(request, writer)
+                    elif op == "move":
+                        await self._move(request, writer)
+                    elif op == "state":
+                        game = self._game(request)
+                        await self._send(
+                            writer, self._state(game, self._color_of(game, writer))
+                        )
+                    elif op == "stats":
+                        await self._send(writer, self.stats())
+                    else:
+                        raise ValueError(f"Unknown op: {op}")
+                except Exception as e:  # a bad request must not end the session
+                    message = str(e) if isinstance(e, ValueError) else repr(e)
+                    await self._send(writer, {"event": "error", "message": message})
+        except ConnectionError:
+            pass
+        finally:
+            for game in list(self.games.values()):
+                for color in [c for c, w in game.players.items() if w is writer]:
+                    del game.players[color]
+                if not game.players:  # nobody can come back to it
+                    del self.games[game.id]
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m fow_chess.server",
+        description="Host fog-of-war games over TCP with JSON lines.",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-w", "--workers", type=int, help="fog worker processes")
+    parser.add_argument("--backend", choices=BACKENDS, default="default")
+    args = parser.parse_args(argv)
+
+    with fog_pool(args.workers) as executor:
+        server = GameServer(executor, args.backend)
+        try:
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
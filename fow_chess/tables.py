@@ -0,0 +1,135 @@
+# Precomputed move generation tables, indexed by square (rank - 1) * 8 + (file - 1).
+# Masks (ints with one bit per square) drive the bitboard backend; the *_TARGETS
+# lists hold the same squares as interned Positions for the default backend.
+from typing import Iterator, List, Tuple
+
+from fow_chess.position import SQUARES, Position
+
+
+def iter_bits(bb: int) -> Iterator[int]:
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+
+def _on_board(rank: int, file: int) -> bool:
+    return 0 <= rank < 8 and 0 <= file < 8
+
+
+def _step_attacks(deltas: List[Tuple[int, int]]) -> List[int]:
+    table = []
+    for square in range(64):
+        rank, file = divmod(square, 8)
+        bb = 0
+        for d_rank, d_file in deltas:
+            if _on_board(rank + d_rank, file + d_file):
+                bb |= 1 << ((rank + d_rank) * 8 + file + d_file)
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _step_attacks(
+    [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)]
+)
+KING_ATTACKS = _step_attacks(
+    [(1, 1), (1, 0), (1, -1), (0, 1), (0, -1), (-1, 1), (-1, 0), (-1, -1)]
+)
+PAWN_ATTACKS = [
+    _step_attacks([(1, 1), (1, -1)]),  # white
+    _step_attacks([(-1, 1), (-1, -1)]),  # black
+]
+
+# Ray directions as (rank step, file step). "Positive" rays walk towards higher
+# square indices, so their nearest blocker is the lowest set bit.
+BISHOP_DIRECTIONS = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+ROOK_DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+def _rays(d_rank: int, d_file: int) -> List[int]:
+    table = []
+    for square in range(64):
+        rank, file = divmod(square, 8)
+        bb = 0
+        rank += d_rank
+        file += d_file
+        while _on_board(rank, file):
+            bb |= 1 << (rank * 8 + file)
+            rank += d_rank
+            file += d_file
+        table.append(bb)
+    return table
+
+
+def _is_positive(d_rank: int, d_file: int) -> bool:
+    return d_rank > 0 or (d_rank == 0 and d_file > 0)
+
+
+BISHOP_RAYS = [(_rays(*d), _is_positive(*d)) for d in BISHOP_DIRECTIONS]
+ROOK_RAYS = [(_rays(*d), _is_positive(*d)) for d in ROOK_DIRECTIONS]
+# every square a bishop / rook on the square could reach on an empty board
+BISHOP_LINES = [sum(table[square] for table, _ in BISHOP_RAYS) for square in range(64)]
+ROOK_LINES = [sum(table[square] for table, _ in ROOK_RAYS) for square in range(64)]
+
+
+def slider_attacks(square: int, occupied: int, rays) -> int:
+    attacks = 0
+    for table, positive in rays:
+        ray = table[square]
+        blockers = ray & occupied
+        if blockers:
+            if positive:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= table[first]
+        attacks |= ray
+    return attacks
+
+
+def bishop_attacks(square: int, occupied: int) -> int:
+    return slider_attacks(square, occupied, BISHOP_RAYS)
+
+
+def rook_attacks(square: int, occupied: int) -> int:
+    return slider_attacks(square, occupied, ROOK_RAYS)
+
+
+def _between(a: int, b: int) -> int:
+    for table, _ in BISHOP_RAYS + ROOK_RAYS:
+        if table[a] >> b & 1:
+            return table[a] & ~table[b] & ~(1 << b)
+    return 0
+
+
+# BETWEEN[a][b]: squares strictly between a and b if they share a line, else 0
+BETWEEN = [[_between(a, b) for b in range(64)] for a in range(64)]
+
+
+def between(a: int, b: int) -> int:
+    return BETWEEN[a][b]
+
+
+def _positions(bb: int) -> List[Position]:
+    return [SQUARES[square] for square in iter_bits(bb)]
+
+
+def _ray_positions(ray: int, positive: bool) -> List[Position]:
+    # nearest square first
+    positions = _positions(ray)
+    return positions if positive else positions[::-1]
+
+
+KNIGHT_TARGETS = [_positions(bb) for bb in KNIGHT_ATTACKS]
+KING_TARGETS = [_positions(bb) for bb in KING_ATTACKS]
+PAWN_CAPTURE_TARGETS = [[_positions(bb) for bb in table] for table in PAWN_ATTACKS]
+# *_RAY_TARGETS[square]: one list per direction, in the order of *_DIRECTIONS
+BISHOP_RAY_TARGETS = [
+    [_ray_positions(table[square], positive) for table, positive in BISHOP_RAYS]
+    for square in range(64)
+]
+ROOK_RAY_TARGETS = [
+    [_ray_positions(table[square], positive) for table, positive in ROOK_RAYS]
+    for square in range(64)
+]
+BETWEEN_SQUARES = [[tuple(_positions(bb)) for bb in row] for row in BETWEEN]
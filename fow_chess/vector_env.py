@@ -0,0 +1,239 @@
+# Batched environment for reinforcement learning: N games advanced by one
+# step() call that takes one action per game and returns NumPy arrays only.
+# Actions are those of fow_chess.actions. Finished games start over
+# automatically.
+import multiprocessing
+from multiprocessing.connection import Connection
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from fow_chess.actions import ACTION_SIZE, packed_to_actions
+from fow_chess.board import Board
+from fow_chess.chesscolor import ChessColor
+from fow_chess.encoding import encode_fow_batch
+
+
+class Step(NamedTuple):
+    observations: np.ndarray  # (N, 8, 8, 20) to_fow_array of the side to move
+    rewards: np.ndarray  # (N,) float32, for the player who made the move
+    dones: np.ndarray  # (N,) bool, the game ended (and was reset)
+    truncated: np.ndarray  # (N,) bool, the game was cut off at max_plies
+    masks: np.ndarray  # (N, ACTION_SIZE) bool, legal actions of the side to move
+
+
+class _Games:
+    # The games of one process; VectorEnv runs one of these in-process or one
+    # per worker.
+    def __init__(
+        self,
+        num_envs: int,
+        fen: Optional[str],
+        backend: str,
+        max_plies: int,
+        offset: int = 0,
+    ):
+        self.offset = offset  # index of the first game in the VectorEnv
+        self.fen = fen
+        self.backend = backend
+        self.max_plies = max_plies
+        self.boards: List[Board] = [
+            Board(fen, backend=backend) for _ in range(num_envs)
+        ]
+        self.plies = np.zeros(num_envs, dtype=np.int64)
+        # per game: action -> packed move
+        self.actions: List[dict] = [{} for _ in range(num_envs)]
+        self.observations = np.empty((num_envs, 8, 8, 20), dtype=bool)
+        self.masks = np.empty((num_envs, ACTION_SIZE), dtype=bool)
+
+    def _new_game(self, i: int):
+        self.boards[i] = Board(self.fen, backend=self.backend)
+        self.plies[i] = 0
+
+    # Fills observations and masks; returns the games without legal moves
+    def _observe(self) -> List[int]:
+        stuck = []
+        self.masks[:] = False
+        for i, board in enumerate(self.boards):
+            packed = np.frombuffer(
+                board.legal_moves_packed(board.side_to_move), dtype=np.uint16
+            )
+            actions = packed_to_actions(packed)
+            self.masks[i, actions] = True
+            self.actions[i] = dict(zip(actions.tolist(), packed.tolist()))
+            if not len(packed):
+                stuck.append(i)
+        encode_fow_batch(
+            self.boards,
+            [board.side_to_move for board in self.boards],
+            out=self.observations,
+        )
+        return stuck
+
+    def reset(self):
+        for i in range(len(self.boards)):
+            self._new_game(i)
+        self._observe()
+        return self.observations, self.masks
+
+    def step(self, actions: np.ndarray):
+        n = len(self.boards)
+        rewards = np.zeros(n, dtype=np.float32)
+        dones = np.zeros(n, dtype=bool)
+        truncated = np.zeros(n, dtype=bool)
+        # checked before any game moves, so that an error leaves all untouched
+        moves = [legal.get(int(action)) for legal, action in zip(self.actions, actions)]
+        if None in moves:
+            i = moves.index(None)
+            raise ValueError(
+                f"Illegal action {int(actions[i])} in game {self.offset + i}"
+            )
+        for i, (board, packed) in enumerate(zip(self.boards, moves)):
+            mover = board.side_to_move
+            result = board.apply_packed(packed)
+            self.plies[i] += 1
+            if result is not None:
+                if result != ChessColor.DRAW:
+                    rewards[i] = 1.0 if result == mover else -1.0
+                dones[i] = True
+            elif self.plies[i] >= self.max_plies:
+                dones[i] = truncated[i] = True
+            if dones[i]:
+                self._new_game(i)
+        stuck = self._observe()
+        if stuck:
+            # the side to move has no moves left: a draw
+            for i in stuck:
+                dones[i] = True
+                truncated[i] = False
+                self._new_game(i)
+            self._observe()
+        return self.observations, rewards, dones, truncated, self.masks
+
+
+def _worker(connection: Connection, num_envs, fen, backend, max_plies, offset):
+    games = _Games(num_envs, fen, backend, max_plies, offset)
+    try:
+        while True:
+            command, actions = connection.recv()
+            if command == "step":
+                try:
+                    connection.send(games.step(actions))
+                except ValueError as e:
+                    connection.send(e)
+            elif command == "reset":
+                connection.send(games.reset())
+            else:
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        connection.close()
+
+
+class VectorEnv:
+    """Steps num_envs fog-of-war games at once.
+
+    Observations are the to_fow_array views of the side to move of every
+    game, masks the legal actions. A reward goes to the player who made the
+    move: 1 for a win, -1 for a loss and 0 otherwise. Games that end or reach
+    max_plies are reset at once, so step returns the first observation of
+    the new game for them. With workers > 0 the games are split over that
+    many worker processes, stepped in parallel.
+    """
+
+    def __init__(
+        self,
+        num_envs: int,
+        fen: Optional[str] = None,
+        backend: str = "default",
+        max_plies: int = 512,
+        workers: int = 0,
+    ):
+        self.num_envs = num_envs
+        self._games: Optional[_Games] = None
+        self._connections: List[Connection] = []
+        self._processes: List[multiprocessing.Process] = []
+        if workers <= 0:
+            self._games = _Games(num_envs, fen, backend, max_plies)
+            return
+        # the legal actions of the last observations, which step checks before
+        # any worker moves (nothing is legal before reset)
+        self._masks = np.zeros((num_envs, ACTION_SIZE), dtype=bool)
+        shares = [
+            num_envs // workers + (i < num_envs % workers) for i in range(workers)
+        ]
+        self._bounds = np.cumsum([0, *[share for share in shares if share]])
+        for share, offset in zip(shares, self._bounds):
+            if not share:
+                continue
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker,
+                args=(child, share, fen, backend, max_plies, int(offset)),
+                daemon=True,
+            )
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for connection in self._connections:
+            try:
+                connection.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
+
+    # returns: observations (N, 8, 8, 20) and masks (N, ACTION_SIZE)
+    def reset(self):
+        if self._games is not None:
+            observations, masks = self._games.reset()
+            return observations.copy(), masks.copy()
+        for connection in self._connections:
+            connection.send(("reset", None))
+        parts = [connection.recv() for connection in self._connections]
+        observations, masks = (np.concatenate(arrays) for arrays in zip(*parts))
+        self._masks = masks.copy()
+        return observations, masks
+
+    def step(self, actions: Sequence[int]) -> Step:
+        actions = np.asarray(actions)
+        if actions.shape != (self.num_envs,):
+            raise ValueError(f"Expected {self.num_envs} actions, got {actions.shape}")
+        if self._games is not None:
+            observations, rewards, dones, truncated, masks = self._games.step(actions)
+            return Step(observations.copy(), rewards, dones, truncated, masks.copy())
+        self._check_actions(actions)
+        for connection, start, end in zip(
+            self._connections, self._bounds, self._bounds[1:]
+        ):
+            connection.send(("step", actions[start:end]))
+        parts = [connection.recv() for connection in self._connections]
+        for part in parts:
+            if isinstance(part, Exception):
+                raise part
+        step = Step(*(np.concatenate(arrays) for arrays in zip(*parts)))
+        self._masks = step.masks.copy()
+        return step
+
+    # Workers only see their own games, so the whole batch is checked here:
+    # one illegal action must not leave the other workers' games moved.
+    def _check_actions(self, actions: np.ndarray):
+        indices = actions.astype(np.int64)
+        legal = (indices >= 0) & (indices < ACTION_SIZE)
+        legal[legal] = self._masks[np.flatnonzero(legal), indices[legal]]
+        if not legal.all():
+            i = int(np.argmin(legal))
+            raise ValueError(f"Illegal action {int(actions[i])} in game {i}")
@@ -0,0 +1,121 @@
+# Zobrist keys: a position's hash is the xor of one random 64-bit key per
+# (piece plane, square), per castling right, for the en passant file and for
+# black to move. Keys come from a fixed seed, so hashes agree across processes.
+import random
+from typing import TYPE_CHECKING, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from fow_chess.chesscolor import ChessColor
+from fow_chess.position import Position
+
+if TYPE_CHECKING:
+    from fow_chess.board import Board
+
+_random = random.Random(0x5EED_F0C5)
+# PIECE_KEYS[color * 6 + ordinal][square], in the plane order of to_array
+PIECE_KEYS = [[_random.getrandbits(64) for _ in range(64)] for _ in range(12)]
+CASTLING_KEYS = [_random.getrandbits(64) for _ in range(4)]
+EN_PASSANT_KEYS = [_random.getrandbits(64) for _ in range(8)]
+BLACK_TO_MOVE_KEY = _random.getrandbits(64)
+del _random
+
+
+def castling_key(rights: Tuple[bool, bool, bool, bool]) -> int:
+    key = 0
+    for right, right_key in zip(rights, CASTLING_KEYS):
+        if right:
+            key ^= right_key
+    return key
+
+
+def en_passant_key(en_passant: Optional[Position]) -> int:
+    return 0 if en_passant is None else EN_PASSANT_KEYS[en_passant.file - 1]
+
+
+# Hash computed from scratch; apply_move and pop keep Board.hash equal to this.
+def hash_board(board: "Board") -> int:
+    key = castling_key(board.castling_rights()) ^ en_passant_key(board.en_passant)
+    if board.side_to_move == ChessColor.BLACK:
+        key ^= BLACK_TO_MOVE_KEY
+    for keys, mask in zip(PIECE_KEYS, board.piece_masks()):
+        while mask:
+            low = mask & -mask
+            key ^= keys[low.bit_length() - 1]
+            mask ^= low
+    return key
+
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+class TTEntry(NamedTuple):
+    key: int
+    depth: int
+    value: float
+    move: int  # packed move, see fow_chess.packed_move
+    bound: int
+
+
+class TranspositionTable:
+    """Fixed-size hash table from Zobrist keys to search results.
+
+    Each key maps to a single slot (key modulo the size, a power of two). A new
+    entry replaces the old one unless the old one is from the current search
+    and was searched deeper. Call new_search() between searches to age entries.
+    """
+
+    def __init__(self, size: int = 1 << 20):
+        size = 1 << max(size - 1, 1).bit_length()
+        self.mask = size - 1
+        self.keys = np.zeros(size, dtype=np.uint64)
+        self.depths = np.full(size, -1, dtype=np.int16)
+        self.values = np.zeros(size, dtype=np.float32)
+        self.moves = np.zeros(size, dtype=np.uint16)
+        self.bounds = np.zeros(size, dtype=np.uint8)
+        self.ages = np.zeros(size, dtype=np.uint8)
+        self.age = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def new_search(self):
+        self.age = (self.age + 1) & 0xFF
+
+    def clear(self):
+        self.depths[:] = -1
+        self.age = 0
+
+    def probe(self, key: int) -> Optional[TTEntry]:
+        slot = key & self.mask
+        if self.depths[slot] < 0 or int(self.keys[slot]) != key:
+            return None
+        return TTEntry(
+            key,
+            int(self.depths[slot]),
+            float(self.values[slot]),
+            int(self.moves[slot]),
+            int(self.bounds[slot]),
+        )
+
+    # returns: whether the entry was stored
+    def store(
+        self, key: int, depth: int, value: float, move: int = 0, bound: int = EXACT
+    ) -> bool:
+        slot = key & self.mask
+        if (
+            self.depths[slot] >= 0
+            and self.ages[slot] == self.age
+            and int(self.keys[slot]) != key
+            and self.depths[slot] > depth
+        ):
+            return False
+        self.keys[slot] = key
+        self.depths[slot] = depth
+        self.values[slot] = value
+        self.moves[slot] = move
+        self.bounds[slot] = bound
+        self.ages[slot] = self.age
+        return True
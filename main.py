@@ -10,23 +10,18 @@ def main():
         print(f"FOW FEN: {board.fow_fen}")
         print(f"Turn: {board.side_to_move}")
         print(f"En passant: {board.en_passant}")
-        legal_moves = board.get_legal_moves(board.side_to_move)
-        move_candidates = []
-        for moves in legal_moves.values():
-            for move in moves:
-                move_candidates.append(move)
+        legal_moves = board.legal_moves_san(board.side_to_move)
+        move_candidates = list(legal_moves.values())
         print(
             f"Move candidates: ",
-            ",".join(
-                [f"{i}: {move.to_san()}" for i, move in enumerate(move_candidates)]
-            ),
+            ",".join([f"{i}: {san}" for i, san in enumerate(legal_moves)]),
         )
         str_move = input("Enter move: ")
         if str_move == "q":
             break
         move = int(str_move)
         selected_move = move_candidates[move]
-        print(f"Selected move: {selected_move}")
+        print(f"Selected move: {selected_move.to_san(board)}")
         # board.push_san(move)
         board.apply_move(selected_move)
 